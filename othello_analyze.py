@@ -0,0 +1,236 @@
+# Batch game analysis
+#
+# usage: python othello_analyze.py GAMES -o analysis.jsonl [--depth D]
+#                                  [--workers N] [--chunk-size C] [--resume]
+#
+# GAMES is a game record file (.rec, .rec.gz, .rec.zst) or the JSON lines of
+# a tournament. Every game is replayed and each move gets the engine's best
+# move and score and the score of the move that was played, from the side of
+# the player to move. "loss" is how much the played move gave away. Moves
+# with at most --endgame empties are solved exactly and marked "exact"; their
+# scores and loss are in discs. The other moves are in the units of the
+# heuristic evaluation, which are not comparable to discs, so each game
+# reports the two separately: black_loss/white_loss sum the heuristic losses
+# and black_exact_loss/white_exact_loss the losses in discs. One JSON line
+# is written per game, in the order of the input.
+#
+# Games are analyzed by a process pool in chunks. Only a few chunks are in
+# flight at a time, so memory does not grow with the size of the input, and
+# finished chunks are written as soon as every chunk before them is done.
+# After each chunk the number of games written and the size of the output
+# are saved to OUTPUT.checkpoint; --resume cuts the output back to that size
+# (dropping a half-written chunk) and continues with the next game.
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from multiprocessing import Pool
+from typing import Iterator
+
+from othello_bitboard import PASS, to_xy
+from othello_endgame import EndgameSolver
+from othello_engine import FINAL_SCALE, INFINITY, Engine
+from othello_record import MAGIC, GameRecordReader, open_stream, replay
+from othello_ttable import TranspositionTable
+from othello_withclass import Othello, Stone
+
+
+def read_games(path: str) -> Iterator[bytes]:
+    # the moves of every game as square indexes, PASS for a pass
+    with open_stream(path, "r") as stream:
+        is_record = stream.read(len(MAGIC)) == MAGIC
+    if is_record:
+        for moves, _ in GameRecordReader(path):
+            yield moves
+        return
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield bytes(json.loads(line)["moves"])
+
+
+def read_chunks(
+    path: str, start: int, chunk_size: int
+) -> Iterator[list[tuple[int, bytes]]]:
+    chunk = []
+    for index, moves in enumerate(read_games(path)):
+        if index < start:
+            continue
+        chunk.append((index, moves))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# one engine per worker process, so the transposition table is reused
+engine: Engine | None = None
+
+
+def create_engine(depth: int, endgame_empties: int, table_size: int) -> None:
+    global engine
+    engine = Engine(None, depth, TranspositionTable(table_size), endgame_empties)
+
+
+def score_position(othello: Othello, color: Stone, depth: int, exact: bool) -> int:
+    # the value of the position for color, searched the way the engine's
+    # root search searched its moves
+    if exact:
+        player, opponent = othello.get_bitboards(color)
+        return EndgameSolver().solve(player, opponent, -64, 64) * FINAL_SCALE
+    engine.deadline = float("inf")
+    return engine.negamax(othello, color, depth, -INFINITY, INFINITY)
+
+
+def analyze_move(othello: Othello, color: Stone, square: int) -> dict:
+    x, y = to_xy(square)
+    empties = 64 - (othello.black | othello.white).bit_count()
+    exact = empties <= engine.endgame_empties
+    best = engine.search(othello, color)
+    best_score = played_score = engine.score
+    if best != (x, y):
+        othello.make_move(x, y, color)
+        played_score = -score_position(
+            othello, Stone.flip_color(color), engine.depth - 1, exact
+        )
+        othello.unmake_move()
+    if exact:
+        best_score //= FINAL_SCALE
+        played_score //= FINAL_SCALE
+    return {
+        "color": color.name.lower(),
+        "move": [x, y],
+        "best": list(best),
+        "exact": exact,
+        "score": best_score,
+        "played": played_score,
+        # a table entry from a deeper search can make the played move look
+        # slightly better than the best one
+        "loss": max(best_score - played_score, 0),
+    }
+
+
+def analyze_game(index: int, moves: bytes) -> dict:
+    # a fresh table per game keeps the results independent of which worker
+    # analyzed which games before
+    engine.table.clear()
+    othello = Othello()
+    annotations = []
+    # heuristic losses before the endgame, disc losses in it
+    losses = {"black": 0, "white": 0}
+    exact_losses = {"black": 0, "white": 0}
+    try:
+        for ply, (color, square) in enumerate(replay(othello, moves)):
+            if square == PASS:
+                continue
+            if not (othello.get_legal_moves(color) >> square) & 1:
+                # not analyzed; replay raises on it right after
+                continue
+            annotation = {"ply": ply, **analyze_move(othello, color, square)}
+            annotations.append(annotation)
+            if annotation["exact"]:
+                exact_losses[annotation["color"]] += annotation["loss"]
+            else:
+                losses[annotation["color"]] += annotation["loss"]
+    except ValueError as e:
+        return {"game": index, "error": str(e)}
+    return {
+        "game": index,
+        "black_discs": othello.black.bit_count(),
+        "white_discs": othello.white.bit_count(),
+        "black_loss": losses["black"],
+        "white_loss": losses["white"],
+        "black_exact_loss": exact_losses["black"],
+        "white_exact_loss": exact_losses["white"],
+        "moves": annotations,
+    }
+
+
+def analyze_chunk(chunk: list[tuple[int, bytes]]) -> tuple[int, str]:
+    # the lines are encoded here so the parent only has to write them
+    lines = [json.dumps(analyze_game(index, moves)) + "\n" for index, moves in chunk]
+    return len(chunk), "".join(lines)
+
+
+def read_checkpoint(path: str) -> tuple[int, int]:
+    with open(path) as f:
+        checkpoint = json.load(f)
+    return checkpoint["games"], checkpoint["bytes"]
+
+
+def write_checkpoint(path: str, games: int, size: int) -> None:
+    # replaced in one step, so a crash leaves either the old or the new one
+    with open(path + ".tmp", "w") as f:
+        json.dump({"games": games, "bytes": size}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Annotate recorded games")
+    parser.add_argument("games", help="game record file or tournament JSON lines")
+    parser.add_argument("-o", "--output", required=True)
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument(
+        "--endgame", type=int, default=10, help="solve exactly with this many empties"
+    )
+    parser.add_argument("--table-size", type=int, default=1 << 16)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=16, help="games per task")
+    parser.add_argument("--start", type=int, default=0, help="first game to analyze")
+    parser.add_argument(
+        "--resume", action="store_true", help="continue from OUTPUT.checkpoint"
+    )
+    args = parser.parse_args()
+
+    checkpoint_path = args.output + ".checkpoint"
+    start, size = args.start, 0
+    if args.resume and os.path.exists(checkpoint_path):
+        start, size = read_checkpoint(checkpoint_path)
+        print(f"resuming at game {start}", file=sys.stderr)
+    output = open(args.output, "r+b" if size else "wb")
+    output.truncate(size)
+    output.seek(size)
+
+    # enough chunks in flight to keep every worker busy while the oldest one
+    # is waited for
+    max_pending = 2 * args.workers
+    games = start
+    begin = time.perf_counter()
+    try:
+        with Pool(
+            args.workers, create_engine, (args.depth, args.endgame, args.table_size)
+        ) as pool:
+            pending = deque()
+            chunks = read_chunks(args.games, start, args.chunk_size)
+            while True:
+                for chunk in chunks:
+                    pending.append(pool.apply_async(analyze_chunk, (chunk,)))
+                    if len(pending) >= max_pending:
+                        break
+                if not pending:
+                    break
+                count, lines = pending.popleft().get()
+                output.write(lines.encode())
+                output.flush()
+                os.fsync(output.fileno())
+                games += count
+                write_checkpoint(checkpoint_path, games, output.tell())
+                elapsed = time.perf_counter() - begin
+                print(
+                    f"\r{games} games, {(games - start) / elapsed:.2f} games/s",
+                    end="",
+                    file=sys.stderr,
+                )
+    finally:
+        output.close()
+    print(file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
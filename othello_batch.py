@@ -0,0 +1,137 @@
+# Batched Othello move generation with NumPy
+#
+# Boards are (N, 8, 8) int8 arrays using the Stone values (0 empty, 1 black,
+# 2 white) or pairs of (N,) uint64 bitboards laid out like othello_bitboard.
+# Every function works on the whole batch at once.
+
+import numpy as np
+
+from othello_bitboard import LEFT_SHIFTS, RIGHT_SHIFTS
+
+EMPTY = 0
+BLACK = 1
+WHITE = 2
+
+SHIFTS = [(np.uint64(shift), np.uint64(mask), True) for shift, mask in LEFT_SHIFTS] + [
+    (np.uint64(shift), np.uint64(mask), False) for shift, mask in RIGHT_SHIFTS
+]
+ONE = np.uint64(1)
+
+
+def shift(
+    bits: np.ndarray, amount: np.uint64, mask: np.uint64, left: bool
+) -> np.ndarray:
+    if left:
+        return (bits << amount) & mask
+    return (bits >> amount) & mask
+
+
+def popcount(bits: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(bits).astype(np.int8)
+    as_bytes = bits.astype("<u8").view(np.uint8).reshape(*bits.shape, 8)
+    return np.unpackbits(as_bytes, axis=-1).sum(axis=-1, dtype=np.int8)
+
+
+def to_bitboards(boards: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    cells = np.asarray(boards).reshape(-1, 64)
+    black = np.packbits(cells == BLACK, axis=1, bitorder="little")
+    white = np.packbits(cells == WHITE, axis=1, bitorder="little")
+    return black.view("<u8")[:, 0], white.view("<u8")[:, 0]
+
+
+def to_boards(black: np.ndarray, white: np.ndarray) -> np.ndarray:
+    def unpack(bits: np.ndarray) -> np.ndarray:
+        as_bytes = np.ascontiguousarray(bits, dtype="<u8").view(np.uint8)
+        return np.unpackbits(as_bytes.reshape(-1, 8), axis=1, bitorder="little")
+
+    boards = (
+        unpack(black).astype(np.int8) * BLACK + unpack(white).astype(np.int8) * WHITE
+    )
+    return boards.reshape(-1, 8, 8)
+
+
+def split_colors(
+    black: np.ndarray, white: np.ndarray, color: int | np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    is_black = np.asarray(color) == BLACK
+    return np.where(is_black, black, white), np.where(is_black, white, black)
+
+
+def join_colors(
+    player: np.ndarray, opponent: np.ndarray, color: int | np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    is_black = np.asarray(color) == BLACK
+    return np.where(is_black, player, opponent), np.where(is_black, opponent, player)
+
+
+def get_moves(player: np.ndarray, opponent: np.ndarray) -> np.ndarray:
+    empty = ~(player | opponent)
+    moves = np.zeros_like(player)
+    for amount, mask, left in SHIFTS:
+        o = opponent & mask
+        t = o & shift(player, amount, mask, left)
+        for _ in range(5):
+            t |= o & shift(t, amount, mask, left)
+        moves |= empty & shift(t, amount, mask, left)
+    return moves
+
+
+def get_flips(
+    player: np.ndarray, opponent: np.ndarray, squares: np.ndarray
+) -> np.ndarray:
+    squares = np.asarray(squares)
+    on_board = (squares >= 0) & (squares < 64)
+    bits = np.where(
+        on_board, ONE << np.where(on_board, squares, 0).astype(np.uint64), 0
+    )
+    bits = bits.astype(np.uint64) & ~(player | opponent)
+
+    flips = np.zeros_like(player)
+    for amount, mask, left in SHIFTS:
+        line = opponent & shift(bits, amount, mask, left)
+        for _ in range(5):
+            line |= opponent & shift(line, amount, mask, left)
+        closed = (player & shift(line, amount, mask, left)) != 0
+        flips |= np.where(closed, line, 0).astype(np.uint64)
+    return flips
+
+
+def get_flip_counts(player: np.ndarray, opponent: np.ndarray) -> np.ndarray:
+    # (N, 64) number of stones each move would flip, 0 for illegal squares
+    counts = np.zeros((len(player), 64), dtype=np.int8)
+    for square in range(64):
+        squares = np.full(len(player), square)
+        counts[:, square] = popcount(get_flips(player, opponent, squares))
+    return counts
+
+
+def make_moves(
+    player: np.ndarray, opponent: np.ndarray, squares: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    # PASS (64) or an illegal square leaves that board unchanged
+    squares = np.asarray(squares)
+    flips = get_flips(player, opponent, squares)
+    legal = flips != 0
+    placed = np.where(legal, ONE << np.where(legal, squares, 0).astype(np.uint64), 0)
+    placed = placed.astype(np.uint64)
+    return player | flips | placed, opponent & ~flips
+
+
+def legal_move_masks(boards: np.ndarray, color: int | np.ndarray) -> np.ndarray:
+    player, opponent = split_colors(*to_bitboards(boards), color)
+    moves = get_moves(player, opponent)
+    return to_boards(moves, np.zeros_like(moves)).astype(bool)
+
+
+def flip_counts(boards: np.ndarray, color: int | np.ndarray) -> np.ndarray:
+    player, opponent = split_colors(*to_bitboards(boards), color)
+    return get_flip_counts(player, opponent).reshape(-1, 8, 8)
+
+
+def play_moves(
+    boards: np.ndarray, color: int | np.ndarray, squares: np.ndarray
+) -> np.ndarray:
+    player, opponent = split_colors(*to_bitboards(boards), color)
+    player, opponent = make_moves(player, opponent, squares)
+    return to_boards(*join_colors(player, opponent, color))
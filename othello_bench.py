@@ -0,0 +1,345 @@
+# Benchmarks for the Othello engine
+#
+# usage: python othello_bench.py <benchmark> [options]
+
+import argparse
+import contextlib
+import copy
+import io
+import os
+import random
+import time
+import tracemalloc
+
+import othello_core
+import othello_easy_with_color
+from othello_withclass import Othello, Stone
+
+
+def walk_deepcopy(
+    othello: Othello,
+    color: Stone,
+    depth: int,
+    board: list[list[Stone]] | None = None,
+) -> int:
+    # the way a list-based board is searched: every move is played on a deep
+    # copy of a plain list board with the list rules, and the bitboards are
+    # not used at all. othello.board itself is an immutable snapshot, which
+    # deepcopy would share instead of copying
+    if board is None:
+        board = [list(row) for row in othello.board]
+    if depth == 0:
+        return 1
+
+    opponent = Stone.flip_color(color)
+    nodes = 1
+    for x, y in othello_core.get_flip_positions(board, color, opponent, Stone.EMPTY):
+        child = copy.deepcopy(board)
+        othello_core.put(child, x, y, color, opponent, Stone.EMPTY)
+        nodes += walk_deepcopy(othello, opponent, depth - 1, child)
+    return nodes
+
+
+def walk_make_unmake(othello: Othello, color: Stone, depth: int) -> int:
+    if depth == 0:
+        return 1
+
+    nodes = 1
+    for x, y in othello.get_flip_positions(color):
+        othello.make_move(x, y, color)
+        nodes += walk_make_unmake(othello, Stone.flip_color(color), depth - 1)
+        othello.unmake_move()
+    return nodes
+
+
+def bench_undo(depth: int) -> None:
+    print(f"tree walk from the initial position, depth {depth}")
+    for name, walk in (("deepcopy", walk_deepcopy), ("make/unmake", walk_make_unmake)):
+        start = time.perf_counter()
+        nodes = walk(Othello(), Stone.BLACK, depth)
+        elapsed = time.perf_counter() - start
+
+        # second run under tracemalloc, which would distort the timing
+        othello = Othello()
+        tracemalloc.start()
+        walk(othello, Stone.BLACK, depth)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(
+            f"{name:>12}: {nodes} nodes, {elapsed:.3f} s, "
+            f"{elapsed / nodes * 1e6:.1f} us/node, peak {peak} bytes"
+        )
+
+    # the deepcopy walk also uses the slower list rules; this is the part of
+    # its time per node that only the copy costs
+    board = [list(row) for row in Othello().board]
+    count = 10000
+    start = time.perf_counter()
+    for _ in range(count):
+        copy.deepcopy(board)
+    elapsed = time.perf_counter() - start
+    print(f"{'one deepcopy':>12}: {elapsed / count * 1e6:.1f} us")
+
+
+class CountingRaw(io.RawIOBase):
+    # stands in for a terminal: every write here would be one write(2)
+    def __init__(self):
+        self.writes = 0
+        self.bytes = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.writes += 1
+        self.bytes += len(data)
+        return len(data)
+
+
+def replay_boards(seed: int) -> list[list[list[int]]]:
+    # every position of one random game, as othello_easy_with_color boards
+    game = random.Random(seed)
+    board = othello_easy_with_color.create_board()
+    color = othello_easy_with_color.BLACK
+    boards = [[row[:] for row in board]]
+    while True:
+        positions = othello_easy_with_color.get_flip_positions(board, color)
+        if len(positions) == 0:
+            color = othello_easy_with_color.flip_color(color)
+            if len(othello_easy_with_color.get_flip_positions(board, color)) == 0:
+                return boards
+            continue
+        x, y = game.choice(positions)
+        board = othello_easy_with_color.put(board, x, y, color)
+        boards.append([row[:] for row in board])
+        color = othello_easy_with_color.flip_color(color)
+
+
+def bench_render(seed: int) -> None:
+    boards = replay_boards(seed)
+    print(f"terminal output for a replayed game of {len(boards)} frames")
+    for name, print_board in (
+        ("full redraw", othello_easy_with_color.print_board_full),
+        ("diff", othello_easy_with_color.print_board),
+    ):
+        othello_easy_with_color.last_board = None
+        raw = CountingRaw()
+        # line buffered like sys.stdout on a terminal
+        stdout = io.TextIOWrapper(
+            io.BufferedWriter(raw), encoding="utf-8", line_buffering=True
+        )
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(stdout):
+            for board in boards:
+                print_board(board)
+        stdout.flush()
+        elapsed = time.perf_counter() - start
+
+        frames = len(boards)
+        print(
+            f"{name:>12}: {raw.bytes / frames:.0f} bytes/frame, "
+            f"{raw.writes / frames:.1f} writes/frame, "
+            f"{elapsed / frames * 1e6:.0f} us/frame"
+        )
+
+
+def sample_positions(
+    seed: int, games: int, plies: range
+) -> list[tuple[list[list[int]], int]]:
+    # (board, color to move) at the given plies of random games
+    positions = []
+    for game in range(games):
+        for ply, board in enumerate(replay_boards(seed + game)):
+            if ply in plies:
+                # the color to move is not tracked by replay_boards; passes
+                # are rare enough to ignore here
+                color = [othello_easy_with_color.BLACK, othello_easy_with_color.WHITE][
+                    ply % 2
+                ]
+                positions.append((board, color))
+    return positions
+
+
+def time_per_call(function, positions: list, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for position in positions:
+            function(*position)
+    return (time.perf_counter() - start) / (repeat * len(positions))
+
+
+def bench_moves(seed: int, games: int, repeat: int) -> None:
+    easy = othello_easy_with_color
+    for name, plies in (("mid-game", range(20, 40)), ("late game", range(45, 58))):
+        positions = sample_positions(seed, games, plies)
+        bitboards = []
+        for board, color in positions:
+            othello = Othello()
+            othello.board = [[Stone(cell) for cell in row] for row in board]
+            bitboards.append((othello, Stone(color)))
+        # a legal move of each position, to check legality of a single square
+        moves = [
+            (board, color, *random.Random(seed).choice(legal))
+            for board, color in positions
+            if (legal := easy.get_flip_positions(board, color))
+        ]
+        opponent = easy.flip_color
+
+        def uncached(othello: Othello, color: Stone) -> Othello:
+            othello.legal_moves.clear()
+            return othello
+
+        cases = (
+            (
+                "pass check, lists for both colors",
+                lambda b, c: (
+                    easy.get_flip_positions(b, c),
+                    easy.get_flip_positions(b, opponent(c)),
+                ),
+                positions,
+            ),
+            (
+                "pass check, has_legal_move",
+                lambda b, c: easy.has_legal_move(b, c)
+                or easy.has_legal_move(b, opponent(c)),
+                positions,
+            ),
+            (
+                "move in get_flip_positions",
+                lambda b, c, x, y: (x, y) in easy.get_flip_positions(b, c),
+                moves,
+            ),
+            (
+                "move in iter_legal_moves",
+                lambda b, c, x, y: (x, y) in easy.iter_legal_moves(b, c),
+                moves,
+            ),
+            (
+                "flips, get_flip_direction",
+                lambda b, c, x, y: len(easy.get_flip_direction(b, x, y, c)) > 0,
+                moves,
+            ),
+            (
+                "flips, first of iter_flips",
+                lambda b, c, x, y: next(easy.iter_flips(b, x, y, c), None) is not None,
+                moves,
+            ),
+            (
+                "bitboard, get_legal_moves x2",
+                lambda o, c: (
+                    uncached(o, c).get_legal_moves(c),
+                    o.get_legal_moves(Stone.flip_color(c)),
+                ),
+                bitboards,
+            ),
+            (
+                "bitboard, has_legal_move",
+                lambda o, c: uncached(o, c).has_legal_move(c)
+                or o.has_legal_move(Stone.flip_color(c)),
+                bitboards,
+            ),
+        )
+        print(f"{name}: {len(positions)} positions")
+        for label, function, arguments in cases:
+            seconds = time_per_call(function, arguments, repeat)
+            print(f"{label:>34}: {seconds * 1e6:7.2f} us")
+
+
+def bench_parallel(
+    seed: int, positions: int, depth: int, workers: int, table_size: int
+) -> None:
+    from othello_engine import Engine
+    from othello_parallel import ParallelEngine
+    from othello_ttable import TranspositionTable
+
+    # the position after 24 random plies of each game, black to move
+    games = []
+    for board, color in sample_positions(seed, positions * 2, range(24, 25)):
+        othello = Othello()
+        othello.board = [[Stone(cell) for cell in row] for row in board]
+        if othello.has_legal_move(Stone(color)) and len(games) < positions:
+            games.append((othello, Stone(color)))
+    print(
+        f"{len(games)} mid-game positions, depth {depth}, "
+        f"{os.cpu_count()} CPUs available"
+    )
+
+    def run(engine: Engine) -> tuple[float, int, list[tuple]]:
+        elapsed, nodes, results = 0.0, 0, []
+        for othello, color in games:
+            start = time.perf_counter()
+            move = engine.search(othello, color)
+            elapsed += time.perf_counter() - start
+            nodes += engine.nodes
+            results.append((move, engine.score))
+        return elapsed, nodes, results
+
+    serial, nodes, expected = run(
+        Engine(None, depth, TranspositionTable(table_size), endgame_empties=0)
+    )
+    print(f"{'serial':>10}: {serial:7.2f} s {nodes:>9} nodes")
+    single = None
+    for n in range(1, workers + 1):
+        engine = ParallelEngine(None, depth, table_size, 0, workers=n)
+        # the pool is started outside of the timing
+        engine.max_depth = 1
+        engine.search(*games[0])
+        engine.max_depth = depth
+        elapsed, nodes, results = run(engine)
+        engine.close()
+        if single is None:
+            single = nodes
+        same = sum(result == other for result, other in zip(results, expected))
+        # extra nodes are searched because a move was started before a better
+        # one finished; this does not depend on the number of CPUs
+        print(
+            f"{n:>2} workers: {elapsed:7.2f} s {nodes:>9} nodes "
+            f"(+{nodes / single - 1:.0%}), speedup {serial / elapsed:.2f}, "
+            f"same move and score {same}/{len(games)}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Othello benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    undo = subparsers.add_parser("undo", help="make/unmake vs copy.deepcopy(board)")
+    undo.add_argument("--depth", type=int, default=4)
+
+    render = subparsers.add_parser(
+        "render", help="terminal bytes and writes per frame, full vs diff"
+    )
+    render.add_argument("--seed", type=int, default=0)
+
+    moves = subparsers.add_parser(
+        "moves", help="full move lists vs lazy move and flip iterators"
+    )
+    moves.add_argument("--seed", type=int, default=0)
+    moves.add_argument("--games", type=int, default=20)
+    moves.add_argument("--repeat", type=int, default=20)
+
+    parallel = subparsers.add_parser(
+        "parallel", help="speedup of the multi-process search, 1 to N workers"
+    )
+    parallel.add_argument("--seed", type=int, default=0)
+    parallel.add_argument("--positions", type=int, default=8)
+    parallel.add_argument("--depth", type=int, default=6)
+    parallel.add_argument("--workers", type=int, default=os.cpu_count())
+    parallel.add_argument("--table-size", type=int, default=1 << 18)
+
+    args = parser.parse_args()
+    if args.benchmark == "undo":
+        bench_undo(args.depth)
+    elif args.benchmark == "render":
+        bench_render(args.seed)
+    elif args.benchmark == "moves":
+        bench_moves(args.seed, args.games, args.repeat)
+    elif args.benchmark == "parallel":
+        bench_parallel(
+            args.seed, args.positions, args.depth, args.workers, args.table_size
+        )
+
+
+if __name__ == "__main__":
+    main()
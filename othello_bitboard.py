@@ -0,0 +1,278 @@
+# Othello bitboard primitives
+#
+# A board is a pair of 64-bit integers, one per color.
+# Bit (y * 8 + x) is set when the stone is on (x, y).
+
+import random
+from typing import Iterator
+
+FULL = 0xFFFFFFFFFFFFFFFF
+NOT_LEFT = 0xFEFEFEFEFEFEFEFE  # clears x == 0
+NOT_RIGHT = 0x7F7F7F7F7F7F7F7F  # clears x == 7
+
+# (shift, mask) pairs; the mask removes stones that wrapped around a row
+LEFT_SHIFTS = ((1, NOT_LEFT), (7, NOT_RIGHT), (8, FULL), (9, NOT_LEFT))
+RIGHT_SHIFTS = ((1, NOT_RIGHT), (7, NOT_LEFT), (8, FULL), (9, NOT_RIGHT))
+
+# (dx, dy) of each shift, in the same order as LEFT_SHIFTS / RIGHT_SHIFTS
+LEFT_DIRECTIONS = ((1, 0), (-1, 1), (0, 1), (1, 1))
+RIGHT_DIRECTIONS = ((-1, 0), (1, -1), (0, -1), (-1, -1))
+
+PASS = 64  # square index used for a pass move
+
+INITIAL_BLACK = (1 << 28) | (1 << 35)  # (4, 3), (3, 4)
+INITIAL_WHITE = (1 << 27) | (1 << 36)  # (3, 3), (4, 4)
+
+# Zobrist keys; the seed is fixed so hashes are stable across processes and files
+_zobrist_random = random.Random(20240601)
+ZOBRIST_BLACK = [_zobrist_random.getrandbits(64) for _ in range(64)]
+ZOBRIST_WHITE = [_zobrist_random.getrandbits(64) for _ in range(64)]
+ZOBRIST_FLIP = [b ^ w for b, w in zip(ZOBRIST_BLACK, ZOBRIST_WHITE)]
+ZOBRIST_WHITE_TO_MOVE = _zobrist_random.getrandbits(64)
+
+
+def to_square(x: int, y: int) -> int:
+    return y * 8 + x
+
+
+def to_xy(square: int) -> tuple[int, int]:
+    return square & 7, square >> 3
+
+
+def to_positions(mask: int) -> list[tuple[int, int]]:
+    positions = []
+    while mask:
+        low = mask & -mask
+        square = low.bit_length() - 1
+        positions.append((square & 7, square >> 3))
+        mask ^= low
+    return positions
+
+
+def to_squares(mask: int) -> list[int]:
+    squares = []
+    while mask:
+        low = mask & -mask
+        squares.append(low.bit_length() - 1)
+        mask ^= low
+    return squares
+
+
+def get_moves(player: int, opponent: int) -> int:
+    empty = ~(player | opponent) & FULL
+    moves = 0
+    for shift, mask in LEFT_SHIFTS:
+        o = opponent & mask
+        t = o & (player << shift)
+        t |= o & (t << shift)
+        t |= o & (t << shift)
+        t |= o & (t << shift)
+        t |= o & (t << shift)
+        t |= o & (t << shift)
+        moves |= empty & mask & (t << shift)
+    for shift, mask in RIGHT_SHIFTS:
+        o = opponent & mask
+        t = o & (player >> shift)
+        t |= o & (t >> shift)
+        t |= o & (t >> shift)
+        t |= o & (t >> shift)
+        t |= o & (t >> shift)
+        t |= o & (t >> shift)
+        moves |= empty & mask & (t >> shift)
+    return moves
+
+
+def has_moves(player: int, opponent: int) -> bool:
+    # get_moves(player, opponent) != 0, returning at the first direction
+    # with a move
+    empty = ~(player | opponent) & FULL
+    for shift, mask in LEFT_SHIFTS:
+        o = opponent & mask
+        t = o & (player << shift)
+        if t == 0:
+            continue
+        t |= o & (t << shift)
+        t |= o & (t << shift)
+        t |= o & (t << shift)
+        t |= o & (t << shift)
+        t |= o & (t << shift)
+        if empty & mask & (t << shift):
+            return True
+    for shift, mask in RIGHT_SHIFTS:
+        o = opponent & mask
+        t = o & (player >> shift)
+        if t == 0:
+            continue
+        t |= o & (t >> shift)
+        t |= o & (t >> shift)
+        t |= o & (t >> shift)
+        t |= o & (t >> shift)
+        t |= o & (t >> shift)
+        if empty & mask & (t >> shift):
+            return True
+    return False
+
+
+def get_flips(player: int, opponent: int, square: int) -> int:
+    bit = 1 << square
+    if (player | opponent) & bit:
+        return 0
+
+    flips = 0
+    for shift, mask in LEFT_SHIFTS:
+        line = 0
+        b = (bit << shift) & mask
+        while b & opponent:
+            line |= b
+            b = (b << shift) & mask
+        if b & player:
+            flips |= line
+    for shift, mask in RIGHT_SHIFTS:
+        line = 0
+        b = (bit >> shift) & mask
+        while b & opponent:
+            line |= b
+            b = (b >> shift) & mask
+        if b & player:
+            flips |= line
+    return flips
+
+
+def iter_flips(player: int, opponent: int, square: int) -> Iterator[int]:
+    # the squares get_flips would flip, one direction at a time, nearest first
+    bit = 1 << square
+    if (player | opponent) & bit:
+        return
+
+    for shift, mask in LEFT_SHIFTS:
+        b = (bit << shift) & mask
+        while b & opponent:
+            b = (b << shift) & mask
+        if b & player:
+            b = (bit << shift) & mask
+            while b & opponent:
+                yield b.bit_length() - 1
+                b = (b << shift) & mask
+    for shift, mask in RIGHT_SHIFTS:
+        b = (bit >> shift) & mask
+        while b & opponent:
+            b = (b >> shift) & mask
+        if b & player:
+            b = (bit >> shift) & mask
+            while b & opponent:
+                yield b.bit_length() - 1
+                b = (b >> shift) & mask
+
+
+def get_flip_directions(
+    player: int, opponent: int, square: int
+) -> list[tuple[int, int]]:
+    bit = 1 << square
+    if (player | opponent) & bit:
+        return []
+
+    directions = []
+    for (shift, mask), direction in zip(
+        LEFT_SHIFTS + RIGHT_SHIFTS, LEFT_DIRECTIONS + RIGHT_DIRECTIONS
+    ):
+        left = direction in LEFT_DIRECTIONS
+        b = ((bit << shift) if left else (bit >> shift)) & mask
+        if not b & opponent:
+            continue
+        while b & opponent:
+            b = ((b << shift) if left else (b >> shift)) & mask
+        if b & player:
+            directions.append(direction)
+    # same order as the list-of-lists implementation: dx major, dy minor
+    directions.sort()
+    return directions
+
+
+def get_hash(black: int, white: int) -> int:
+    h = 0
+    for square in to_squares(black):
+        h ^= ZOBRIST_BLACK[square]
+    for square in to_squares(white):
+        h ^= ZOBRIST_WHITE[square]
+    return h
+
+
+def get_flips_hash(flips: int) -> int:
+    h = 0
+    while flips:
+        low = flips & -flips
+        h ^= ZOBRIST_FLIP[low.bit_length() - 1]
+        flips ^= low
+    return h
+
+
+# Board symmetries. Transform t (0-7) mirrors across the a1-h8 diagonal when
+# bit 2 is set, then mirrors left-right when bit 0 is set, then top-bottom
+# when bit 1 is set. Every transform is undone by applying the same three
+# steps in reverse order.
+def flip_horizontal(b: int) -> int:
+    # x -> 7 - x
+    b = ((b >> 1) & 0x5555555555555555) | ((b & 0x5555555555555555) << 1)
+    b = ((b >> 2) & 0x3333333333333333) | ((b & 0x3333333333333333) << 2)
+    return ((b >> 4) & 0x0F0F0F0F0F0F0F0F) | ((b & 0x0F0F0F0F0F0F0F0F) << 4)
+
+
+def flip_vertical(b: int) -> int:
+    # y -> 7 - y
+    return int.from_bytes(b.to_bytes(8, "little"), "big")
+
+
+def flip_diagonal(b: int) -> int:
+    # (x, y) -> (y, x); no in-place operators, so numpy arrays work too
+    t = 0x0F0F0F0F00000000 & (b ^ (b << 28))
+    b = b ^ t ^ (t >> 28)
+    t = 0x3333000033330000 & (b ^ (b << 14))
+    b = b ^ t ^ (t >> 14)
+    t = 0x5500550055005500 & (b ^ (b << 7))
+    return b ^ t ^ (t >> 7)
+
+
+def transform(b: int, t: int) -> int:
+    if t & 4:
+        b = flip_diagonal(b)
+    if t & 1:
+        b = flip_horizontal(b)
+    if t & 2:
+        b = flip_vertical(b)
+    return b
+
+
+def untransform(b: int, t: int) -> int:
+    if t & 2:
+        b = flip_vertical(b)
+    if t & 1:
+        b = flip_horizontal(b)
+    if t & 4:
+        b = flip_diagonal(b)
+    return b
+
+
+# SQUARE_TRANSFORMS[t][square] is where transform t moves a square
+SQUARE_TRANSFORMS = [
+    [transform(1 << square, t).bit_length() - 1 for square in range(64)] + [PASS]
+    for t in range(8)
+]
+SQUARE_UNTRANSFORMS = [
+    [untransform(1 << square, t).bit_length() - 1 for square in range(64)] + [PASS]
+    for t in range(8)
+]
+
+
+def get_symmetries(b: int) -> list[int]:
+    # transform(b, t) for every t, sharing the intermediate steps
+    result = []
+    for base in (b, flip_diagonal(b)):
+        mirrored = flip_horizontal(base)
+        result += [base, mirrored, flip_vertical(base), flip_vertical(mirrored)]
+    return result
+
+
+def get_canonical(player: int, opponent: int) -> tuple[int, int, int]:
+    # the smallest (player, opponent) over the 8 symmetries, and its transform;
+    # symmetric positions share one canonical form
+    return min(zip(get_symmetries(player), get_symmetries(opponent), range(8)))
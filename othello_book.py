@@ -0,0 +1,228 @@
+# Opening book
+#
+# usage: python othello_book.py build --plies P --depth D -o book.bin
+#        python othello_book.py build --games tournament.jsonl --plies P -o book.bin
+#        python othello_book.py show book.bin
+#
+# File layout: a 16-byte header (magic, record count) followed by fixed-size
+# records (position key, best move square, score) sorted by key. The book is
+# memory-mapped and binary-searched in place, so worker processes that open
+# the same file share it through the page cache.
+#
+# Each position is stored once for all 8 of its board symmetries: the key is
+# the hash of the canonical form and the square is in canonical coordinates,
+# translated back to the real board on lookup.
+
+import json
+import mmap
+import os
+import struct
+from collections import defaultdict
+from typing import Iterable, Iterator
+
+from othello_bitboard import (
+    PASS,
+    SQUARE_TRANSFORMS,
+    SQUARE_UNTRANSFORMS,
+    get_canonical,
+    get_hash,
+    to_square,
+    to_xy,
+)
+from othello_engine import Engine
+from othello_withclass import Othello, Stone
+
+MAGIC = b"OTHBOOK2"
+HEADER = struct.Struct("<8sQ")
+RECORD = struct.Struct("<QBi")  # key, square, score
+KEY = struct.Struct("<Q")
+
+
+def get_book_key(othello: Othello, color: Stone) -> tuple[int, int]:
+    # the key of the canonical form and the transform that leads to it; the
+    # stones of the player to move always hash as black
+    player, opponent, transform = get_canonical(*othello.get_bitboards(color))
+    return get_hash(player, opponent), transform
+
+
+class OpeningBook:
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        size = os.fstat(self.file.fileno()).st_size
+        if size < HEADER.size:
+            # mmap cannot map an empty file
+            self.file.close()
+            raise ValueError(f"{path} is not an opening book")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or size < HEADER.size + self.count * RECORD.size:
+            self.close()
+            raise ValueError(f"{path} is not an opening book")
+
+    def close(self) -> None:
+        self.data.close()
+        self.file.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def find(self, key: int) -> tuple[int, int] | None:
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            offset = HEADER.size + middle * RECORD.size
+            (middle_key,) = KEY.unpack_from(self.data, offset)
+            if middle_key < key:
+                low = middle + 1
+            elif middle_key > key:
+                high = middle
+            else:
+                _, square, score = RECORD.unpack_from(self.data, offset)
+                return square, score
+        return None
+
+    def lookup(self, othello: Othello, color: Stone) -> tuple[int, int] | None:
+        key, transform = get_book_key(othello, color)
+        entry = self.find(key)
+        if entry is None:
+            return None
+        # a stale book or a hash collision must never produce an illegal move
+        move = to_xy(SQUARE_UNTRANSFORMS[transform][entry[0]])
+        if move not in othello.get_flip_positions(color):
+            return None
+        return move
+
+    def __iter__(self) -> Iterator[tuple[int, int, int]]:
+        for i in range(self.count):
+            yield RECORD.unpack_from(self.data, HEADER.size + i * RECORD.size)
+
+
+def write_book(path: str, records: Iterable[tuple[int, int, int]]) -> int:
+    entries = {}
+    for key, square, score in records:
+        entries.setdefault(key, (square, score))
+
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(entries)))
+        for key in sorted(entries):
+            f.write(RECORD.pack(key, *entries[key]))
+    return len(entries)
+
+
+def iter_positions(plies: int) -> Iterator[tuple[Othello, Stone]]:
+    # every distinct position with a move to play in the first `plies` plies
+    othello = Othello()
+    seen = set()
+
+    def walk(color: Stone, depth: int) -> Iterator[tuple[Othello, Stone]]:
+        key, _ = get_book_key(othello, color)
+        if depth == plies or key in seen:
+            return
+        seen.add(key)
+
+        positions = othello.get_flip_positions(color)
+        if len(positions) == 0:
+            return
+        yield othello, color
+        for x, y in positions:
+            othello.make_move(x, y, color)
+            yield from walk(Stone.flip_color(color), depth + 1)
+            othello.unmake_move()
+
+    yield from walk(Stone.BLACK, 0)
+
+
+def build_from_search(plies: int, depth: int) -> Iterator[tuple[int, int, int]]:
+    engine = Engine(None, depth, endgame_empties=0)
+    for othello, color in iter_positions(plies):
+        x, y = engine.search(othello, color)
+        key, transform = get_book_key(othello, color)
+        yield key, SQUARE_TRANSFORMS[transform][to_square(x, y)], engine.score
+
+
+def build_from_games(path: str, plies: int) -> Iterator[tuple[int, int, int]]:
+    # per position and move: games played and summed final disc difference
+    # for the mover; the book keeps the move with the best average result
+    totals = defaultdict(lambda: [0, 0])
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            difference = record["black_discs"] - record["white_discs"]
+
+            othello = Othello()
+            color = Stone.BLACK
+            for square in record["moves"][:plies]:
+                if square != PASS:
+                    sign = 1 if color == Stone.BLACK else -1
+                    key, transform = get_book_key(othello, color)
+                    total = totals[key, SQUARE_TRANSFORMS[transform][square]]
+                    total[0] += 1
+                    total[1] += sign * difference
+                    othello.put(*to_xy(square), color)
+                color = Stone.flip_color(color)
+
+    best = {}
+    for (key, square), (games, difference) in totals.items():
+        average = difference / games
+        if key not in best or average > best[key][1]:
+            best[key] = (square, average)
+    for key, (square, average) in best.items():
+        yield key, square, round(average)
+
+
+def count_positions(path: str, plies: int) -> tuple[int, int]:
+    # distinct positions in the first plies of the games, as played and
+    # after folding symmetries
+    positions, canonical = set(), set()
+    with open(path) as f:
+        for line in f:
+            othello = Othello()
+            color = Stone.BLACK
+            for square in json.loads(line)["moves"][:plies]:
+                if square != PASS:
+                    positions.add(get_hash(*othello.get_bitboards(color)))
+                    canonical.add(get_book_key(othello, color)[0])
+                    othello.put(*to_xy(square), color)
+                color = Stone.flip_color(color)
+    return len(positions), len(canonical)
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Othello opening book")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="create a book")
+    build.add_argument("-o", "--output", required=True)
+    build.add_argument("--plies", type=int, default=6)
+    build.add_argument("--depth", type=int, default=4, help="search depth")
+    build.add_argument("--games", help="tournament JSON lines instead of search")
+
+    show = subparsers.add_parser("show", help="print book statistics")
+    show.add_argument("book")
+
+    args = parser.parse_args()
+    if args.command == "build":
+        if args.games:
+            records = build_from_games(args.games, args.plies)
+        else:
+            records = build_from_search(args.plies, args.depth)
+        count = write_book(args.output, records)
+        print(f"{args.output}: {count} positions")
+        if args.games:
+            positions, canonical = count_positions(args.games, args.plies)
+            print(
+                f"{positions} positions as played, {canonical} after folding "
+                f"symmetries ({positions / max(canonical, 1):.2f}x, "
+                f"{(positions - canonical) * RECORD.size} bytes saved)"
+            )
+    elif args.command == "show":
+        book = OpeningBook(args.book)
+        print(f"{args.book}: {len(book)} positions, {len(book) * RECORD.size} bytes")
+        print(f"initial position: {book.lookup(Othello(), Stone.BLACK)}")
+        book.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,482 @@
+# Correctness checks that perft does not cover
+#
+# usage: python othello_check.py [rays] [lazy] [protocol] [cancel]
+#                                [--boards N] [--games N] [--seed S]
+#
+# rays: the ray-table rules of othello_easy and othello_easy_with_color give
+#       the same results as a plain walk in all 8 directions, on random
+#       boards: flip directions of every square, legal positions, and put on
+#       every square including off-board and illegal ones.
+# lazy: on every position of random games, for both colors and in every
+#       implementation, iter_legal_moves yields the moves of
+#       get_flip_positions in the same order, has_legal_move agrees with it,
+#       and iter_flips yields exactly the stones put / make_move flip, for
+#       every square.
+# protocol: an in-process othello_server on a local port plays random games
+#       that are mirrored on an Othello, and every answer must carry the same
+#       board, counts, turn, moves and winner, passes included. Pipelined
+#       requests must be answered in order with their ids, malformed
+#       requests must get an error without closing the connection, a request
+#       over MAX_LINE must get an error before the connection is closed, and
+#       idle games must be evicted.
+# cancel: after pygame.init() (or, without pygame, a SIGTERM handler that
+#       ignores the signal the way SDL's does), cancelling a process-mode
+#       MoveWorker running an unlimited search, and closing the process
+#       pools of ParallelEnginePlayer and MCTSPlayer, return within a second.
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import signal
+import sys
+import threading
+import time
+
+import othello_bitboard
+import othello_easy
+import othello_easy_with_color
+import othello_server
+from othello_engine import EnginePlayer
+from othello_mcts import MCTSPlayer
+from othello_parallel import ParallelEnginePlayer
+from othello_withclass import Othello, Stone
+from othello_worker import MoveWorker
+
+EASY_MODULES = {
+    "easy": (
+        othello_easy,
+        (othello_easy.BLACK_CHAR, othello_easy.WHITE_CHAR, othello_easy.EMPTY_CHAR),
+    ),
+    "easy_with_color": (
+        othello_easy_with_color,
+        (
+            othello_easy_with_color.BLACK,
+            othello_easy_with_color.WHITE,
+            othello_easy_with_color.EMPTY,
+        ),
+    ),
+}
+
+
+# the rules as they were written before the ray tables
+
+
+def reference_flip_direction(board, x, y, color, opponent, empty):
+    directions = []
+    if board[y][x] != empty:
+        return directions
+    for dx in [-1, 0, 1]:
+        for dy in [-1, 0, 1]:
+            opp_count = 0
+            for i in range(1, 8):
+                cx = x + dx * i
+                cy = y + dy * i
+                if not (0 <= cx < 8 and 0 <= cy < 8) or board[cy][cx] == empty:
+                    break
+                elif board[cy][cx] == opponent:
+                    opp_count += 1
+                else:
+                    if opp_count > 0:
+                        directions.append((dx, dy))
+                    break
+    return directions
+
+
+def reference_flip_positions(board, color, opponent, empty):
+    return [
+        (x, y)
+        for y in range(8)
+        for x in range(8)
+        if len(reference_flip_direction(board, x, y, color, opponent, empty)) > 0
+    ]
+
+
+def reference_put(board, x, y, color, opponent, empty):
+    if not (0 <= x < 8 and 0 <= y < 8) or board[y][x] != empty:
+        return board
+    directions = reference_flip_direction(board, x, y, color, opponent, empty)
+    if len(directions) == 0:
+        return board
+    board[y][x] = color
+    for dx, dy in directions:
+        for i in range(1, 8):
+            cx = x + dx * i
+            cy = y + dy * i
+            if board[cy][cx] == opponent:
+                board[cy][cx] = color
+            else:
+                break
+    return board
+
+
+def random_board(rng: random.Random, cells: tuple) -> list[list]:
+    # from nearly empty to nearly full, so that both short and long rays occur
+    weights = [rng.random() for _ in cells]
+    return [rng.choices(cells, weights, k=8) for _ in range(8)]
+
+
+def check_rays(args: argparse.Namespace) -> bool:
+    rng = random.Random(args.seed)
+    errors = 0
+    for name, (module, (black, white, empty)) in EASY_MODULES.items():
+        for _ in range(args.boards):
+            board = random_board(rng, (black, white, empty))
+            for color, opponent in ((black, white), (white, black)):
+                failed = []
+                for y in range(8):
+                    for x in range(8):
+                        if module.get_flip_direction(
+                            board, x, y, color
+                        ) != reference_flip_direction(
+                            board, x, y, color, opponent, empty
+                        ):
+                            failed.append(f"get_flip_direction({x}, {y})")
+                if module.get_flip_positions(board, color) != reference_flip_positions(
+                    board, color, opponent, empty
+                ):
+                    failed.append("get_flip_positions")
+                for y in range(-1, 9):
+                    for x in range(-1, 9):
+                        result = module.put([row[:] for row in board], x, y, color)
+                        expected = reference_put(
+                            [row[:] for row in board], x, y, color, opponent, empty
+                        )
+                        if result != expected:
+                            failed.append(f"put({x}, {y})")
+                if failed:
+                    errors += 1
+                    print(f"{name}: {', '.join(failed[:5])} differ on {board}")
+    print(f"rays: {args.boards} boards per module, both colors, {errors} mismatches")
+    return errors == 0
+
+
+def changed_squares(before: list[list], after: list[list]) -> set[tuple[int, int]]:
+    return {(x, y) for y in range(8) for x in range(8) if before[y][x] != after[y][x]}
+
+
+def check_lazy_position(othello: Othello, color: Stone) -> list[str]:
+    failed = []
+    positions = othello.get_flip_positions(color)
+    if list(othello.iter_legal_moves(color)) != positions:
+        failed.append("Othello.iter_legal_moves")
+    # a copy has no cached mask, so has_legal_move scans the board itself
+    if othello.copy().has_legal_move(color) != bool(positions):
+        failed.append("Othello.has_legal_move")
+    player, opponent = othello.get_bitboards(color)
+    if othello_bitboard.has_moves(player, opponent) != bool(positions):
+        failed.append("othello_bitboard.has_moves")
+    for square in range(64):
+        x, y = othello_bitboard.to_xy(square)
+        flips = othello_bitboard.get_flips(player, opponent, square)
+        iterated = list(othello_bitboard.iter_flips(player, opponent, square))
+        if (
+            len(set(iterated)) != len(iterated)
+            or sum(1 << s for s in iterated) != flips
+        ):
+            failed.append(f"othello_bitboard.iter_flips({x}, {y})")
+        if set(othello.iter_flips(x, y, color)) != set(
+            othello_bitboard.to_positions(flips)
+        ):
+            failed.append(f"Othello.iter_flips({x}, {y})")
+
+    for name, (module, cells) in EASY_MODULES.items():
+        to_cell = dict(zip((Stone.BLACK, Stone.WHITE, Stone.EMPTY), cells))
+        board = [[to_cell[cell] for cell in row] for row in othello.board]
+        module_color = to_cell[color]
+        if module.get_flip_positions(board, module_color) != positions:
+            failed.append(f"{name}.get_flip_positions")
+        if list(module.iter_legal_moves(board, module_color)) != positions:
+            failed.append(f"{name}.iter_legal_moves")
+        if module.has_legal_move(board, module_color) != bool(positions):
+            failed.append(f"{name}.has_legal_move")
+        for y in range(8):
+            for x in range(8):
+                after = module.put([row[:] for row in board], x, y, module_color)
+                flipped = changed_squares(board, after) - {(x, y)}
+                if set(module.iter_flips(board, x, y, module_color)) != flipped:
+                    failed.append(f"{name}.iter_flips({x}, {y})")
+    return failed
+
+
+def check_lazy(args: argparse.Namespace) -> bool:
+    rng = random.Random(args.seed)
+    positions = errors = 0
+    for _ in range(args.games):
+        othello = Othello()
+        color = Stone.BLACK
+        while not othello.is_game_over():
+            for side in (Stone.BLACK, Stone.WHITE):
+                positions += 1
+                failed = check_lazy_position(othello, side)
+                if failed:
+                    errors += 1
+                    print(
+                        f"{', '.join(failed[:5])} differ for {side.name.lower()} "
+                        f"at black {othello.black:#018x}, white {othello.white:#018x}"
+                    )
+            moves = othello.get_flip_positions(color)
+            if moves:
+                othello.make_move(*rng.choice(moves), color)
+            color = Stone.flip_color(color)
+    print(f"lazy: {args.games} games, {positions} positions, {errors} mismatches")
+    return errors == 0
+
+
+def expected_state(othello: Othello, color: Stone | None) -> dict:
+    # what the server should answer for a game in this position, computed
+    # from the board rather than the bitboards the server formats
+    chars = {Stone.BLACK: "B", Stone.WHITE: "W", Stone.EMPTY: "."}
+    state = {
+        "board": ["".join(chars[cell] for cell in row) for row in othello.board],
+        "black": othello.black.bit_count(),
+        "white": othello.white.bit_count(),
+    }
+    if color is None:
+        black, white = state["black"], state["white"]
+        state["winner"] = (
+            "black" if black > white else "white" if white > black else "draw"
+        )
+    else:
+        state["turn"] = color.name.lower()
+        state["moves"] = [list(move) for move in othello.get_flip_positions(color)]
+    return state
+
+
+class ProtocolClient:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader, self.writer = reader, writer
+
+    async def send(self, *lines: bytes) -> list[dict]:
+        self.writer.write(b"".join(line + b"\n" for line in lines))
+        await self.writer.drain()
+        responses = []
+        for _ in lines:
+            line = await self.reader.readline()
+            if not line:
+                raise ConnectionError("the server closed the connection")
+            responses.append(json.loads(line))
+        return responses
+
+    async def request(self, request: dict) -> dict:
+        return (await self.send(json.dumps(request).encode()))[0]
+
+
+async def check_protocol_games(
+    client: ProtocolClient, rng: random.Random, games: int
+) -> list[str]:
+    failed = []
+    for _ in range(games):
+        response = await client.request({"op": "new"})
+        game_id = response.pop("game")
+        othello = Othello()
+        color = Stone.BLACK
+        while True:
+            if response != {"ok": True, **expected_state(othello, color)}:
+                failed.append(f"game {game_id}: {response}")
+                break
+            if color is None:
+                break
+            if rng.random() < 0.01:
+                response = await client.request({"op": "resign", "game": game_id})
+                winner = Stone.flip_color(color).name.lower()
+                if response.get("winner") != winner:
+                    failed.append(f"resign in game {game_id}: {response}")
+                break
+            x, y = rng.choice(othello.get_flip_positions(color))
+            othello.make_move(x, y, color)
+            opponent = Stone.flip_color(color)
+            if othello.has_legal_move(opponent):
+                color = opponent
+            elif not othello.has_legal_move(color):
+                color = None
+            response = await client.request(
+                {"op": "move", "game": game_id, "x": x, "y": y}
+            )
+    return failed
+
+
+async def check_protocol_errors(client: ProtocolClient) -> list[str]:
+    failed = []
+    game_id = (await client.request({"op": "new"}))["game"]
+    over_id = (await client.request({"op": "new"}))["game"]
+    await client.request({"op": "resign", "game": over_id})
+    bad_requests = [
+        b"not json",
+        b"[1, 2]",
+        b'"move"',
+        b'{"op": "fly", "game": %d}' % game_id,
+        b'{"op": "board"}',
+        b'{"op": "board", "game": 0}',
+        b'{"op": "board", "game": [1]}',
+        b'{"op": "board", "game": {"a": 1}}',
+        b'{"op": "board", "game": "%d"}' % game_id,
+        b'{"op": "move", "game": %d, "x": 8, "y": 0}' % game_id,
+        b'{"op": "move", "game": %d, "x": 2.0, "y": 3}' % game_id,
+        b'{"op": "move", "game": %d, "x": true, "y": 3}' % game_id,
+        b'{"op": "move", "game": %d}' % game_id,
+        b'{"op": "move", "game": %d, "x": 0, "y": 0}' % game_id,
+        b'{"op": "move", "game": %d, "x": 2, "y": 3}' % over_id,
+        b'{"op": "resign", "game": %d}' % over_id,
+        b"[" * 4000,
+        b'{"op": "board", "game": %s}' % (b"[" * 4000),
+    ]
+    for line, response in zip(bad_requests, await client.send(*bad_requests)):
+        if response.get("ok") is not False or "error" not in response:
+            failed.append(f"{line!r} answered {response}")
+
+    # the connection survived all of that, and the game is unchanged
+    if await client.request({"op": "board", "game": game_id}) != {
+        "ok": True,
+        **expected_state(Othello(), Stone.BLACK),
+    }:
+        failed.append("board after bad requests")
+
+    # pipelined requests are answered in order, with their ids
+    lines = [
+        json.dumps({"op": op, "game": game_id, "id": i}).encode()
+        for i, op in enumerate(["board", "moves", "fly", "board"] * 8)
+    ]
+    ids = [response.get("id") for response in await client.send(*lines)]
+    if ids != list(range(len(lines))):
+        failed.append(f"pipelined ids {ids}")
+    return failed
+
+
+async def check_protocol_async(args: argparse.Namespace) -> list[str]:
+    server = othello_server.GameServer()
+    listener = await asyncio.start_server(
+        server.serve_connection, "127.0.0.1", 0, limit=othello_server.MAX_LINE
+    )
+    port = listener.sockets[0].getsockname()[1]
+    failed = []
+    async with listener:
+        client = ProtocolClient(*await asyncio.open_connection("127.0.0.1", port))
+        failed += await check_protocol_games(
+            client, random.Random(args.seed), args.games
+        )
+        try:
+            failed += await check_protocol_errors(client)
+        except ConnectionError as e:
+            failed.append(f"bad requests: {e}")
+            client = ProtocolClient(*await asyncio.open_connection("127.0.0.1", port))
+
+        # an overlong line cannot be skipped, so it ends the connection
+        too_long = b'{"op": "board", "pad": "' + b"x" * othello_server.MAX_LINE + b'"}'
+        response = (await client.send(too_long))[0]
+        if response.get("ok") is not False or await client.reader.read() != b"":
+            failed.append(f"overlong request answered {response}")
+        client.writer.close()
+
+        server.idle_timeout = 0
+        if server.evict() == 0 or server.games:
+            failed.append(f"{len(server.games)} games left after eviction")
+    return failed
+
+
+def check_protocol(args: argparse.Namespace) -> bool:
+    failed = asyncio.run(check_protocol_async(args))
+    for failure in failed:
+        print(f"protocol: {failure}")
+    print(f"protocol: {args.games} games and the error cases, {len(failed)} failures")
+    return len(failed) == 0
+
+
+def install_sdl_sigterm_handler() -> None:
+    # what the GUI does before it forks any search process
+    try:
+        os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+        import pygame
+    except ImportError:
+        signal.signal(signal.SIGTERM, lambda signum, frame: None)
+        return
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    pygame.init()
+
+
+def timed_cancel(cancel) -> float | None:
+    # the seconds cancel() took, or None if it was still waiting after 5 s;
+    # the child processes are then killed so that the check does not hang
+    thread = threading.Thread(target=cancel, daemon=True)
+    start = time.perf_counter()
+    thread.start()
+    thread.join(5)
+    if thread.is_alive():
+        for process in multiprocessing.active_children():
+            process.kill()
+        thread.join()
+        return None
+    return time.perf_counter() - start
+
+
+def start_in_thread(player) -> None:
+    # the abandoned get_move may never return, so its thread is a daemon
+    threading.Thread(
+        target=player.get_move, args=(Othello(), Stone.BLACK), daemon=True
+    ).start()
+
+
+def check_cancel(args: argparse.Namespace) -> bool:
+    install_sdl_sigterm_handler()
+    worker = MoveWorker(EnginePlayer(None), "process")
+    parallel = ParallelEnginePlayer(None, workers=2)
+    mcts = MCTSPlayer(None, 1 << 30, workers=2)
+    # each stopped in the middle of an unlimited search, as on a GUI restart
+    cases = [
+        (
+            "process-mode search",
+            lambda: worker.start(Othello(), Stone.BLACK),
+            worker.cancel,
+        ),
+        (
+            "ParallelEnginePlayer pool",
+            lambda: start_in_thread(parallel),
+            parallel.close,
+        ),
+        ("MCTSPlayer pool", lambda: start_in_thread(mcts), mcts.close),
+    ]
+
+    ok = True
+    for name, start, cancel in cases:
+        start()
+        # long enough for the search to be running
+        time.sleep(0.5)
+        elapsed = timed_cancel(cancel)
+        if elapsed is None:
+            print(f"cancel: {name} still running 5 s after it was stopped")
+            ok = False
+        else:
+            print(f"cancel: {name} stopped in {elapsed:.3f} s")
+            ok = ok and elapsed < 1
+    return ok
+
+
+CHECKS = {
+    "rays": check_rays,
+    "lazy": check_lazy,
+    "protocol": check_protocol,
+    "cancel": check_cancel,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Othello correctness checks")
+    parser.add_argument("checks", nargs="*", help=f"{', '.join(CHECKS)} (default: all)")
+    parser.add_argument("--boards", type=int, default=3000, help="random boards")
+    parser.add_argument("--games", type=int, default=30, help="random games")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    for name in args.checks:
+        if name not in CHECKS:
+            parser.error(f"unknown check: {name}")
+
+    ok = True
+    for name in args.checks or CHECKS:
+        ok = CHECKS[name](args) and ok
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
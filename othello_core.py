@@ -0,0 +1,227 @@
+# Rules shared by every version of the game
+#
+# The board is a list of 8 rows of 8 cells. Cells can be any values (the
+# easy versions use characters or numbers, the class version uses Stone), so
+# the functions take the colors they should look for. This module imports
+# nothing, so that the text versions and short-lived worker processes start
+# quickly; pygame and the console setup are loaded by the versions that
+# draw with them, when they start drawing.
+
+# typing costs more to import than this whole module; annotations only
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
+
+# The flat board is the 8x8 board inside a one-cell border of
+# BORDER, 10 cells per row. Every square then has all 8 neighbors,
+# so looking at them needs no bounds check.
+BORDER = object()
+WIDTH = 10
+
+# (dx, dy) in the order get_flip_direction reports them
+DIRECTIONS = [(dx, dy) for dx in [-1, 0, 1] for dy in [-1, 0, 1] if (dx, dy) != (0, 0)]
+NEIGHBOR_OFFSETS = [dy * WIDTH + dx for dx, dy in DIRECTIONS]
+
+
+def create_board(black, white, empty) -> list[list]:
+    b, w, e = black, white, empty
+    return [
+        [e, e, e, e, e, e, e, e],
+        [e, e, e, e, e, e, e, e],
+        [e, e, e, e, e, e, e, e],
+        [e, e, e, w, b, e, e, e],
+        [e, e, e, b, w, e, e, e],
+        [e, e, e, e, e, e, e, e],
+        [e, e, e, e, e, e, e, e],
+        [e, e, e, e, e, e, e, e],
+    ]
+
+
+def is_on_board(x: int, y: int) -> bool:
+    return 0 <= x < 8 and 0 <= y < 8
+
+
+def to_index(x: int, y: int) -> int:
+    return (y + 1) * WIDTH + x + 1
+
+
+def to_flat(board: list[list]) -> list:
+    flat = [BORDER] * WIDTH
+    for row in board:
+        flat += [BORDER] + row + [BORDER]
+    return flat + [BORDER] * WIDTH
+
+
+def create_rays() -> list[list[tuple[tuple[int, int], list[int]]]]:
+    # for each flat index, the directions with room for a flip (at least two
+    # squares before the edge) and the squares along them, nearest first
+    rays = [[] for _ in range(WIDTH * WIDTH)]
+    for y in range(8):
+        for x in range(8):
+            for dx, dy in DIRECTIONS:
+                squares = []
+                cx, cy = x + dx, y + dy
+                while is_on_board(cx, cy):
+                    squares.append(to_index(cx, cy))
+                    cx, cy = cx + dx, cy + dy
+                if len(squares) >= 2:
+                    rays[to_index(x, y)].append(((dx, dy), squares))
+    return rays
+
+
+RAYS = create_rays()
+
+# RAYS as (x, y) squares of the 8x8 board, indexed by y * 8 + x, for the
+# single-square functions: they read the board itself, since building the
+# flat board costs more than the few cells one square looks at
+SQUARE_RAYS = [
+    [
+        (direction, [(index % WIDTH - 1, index // WIDTH - 1) for index in ray])
+        for direction, ray in RAYS[to_index(x, y)]
+    ]
+    for y in range(8)
+    for x in range(8)
+]
+
+
+def find_flips(
+    flat: list, index: int, color, opponent
+) -> list[tuple[tuple[int, int], list[int]]]:
+    # the directions in which a stone at index flips, with the flipped squares
+    for offset in NEIGHBOR_OFFSETS:
+        if flat[index + offset] == opponent:
+            break
+    else:
+        return []
+
+    flips = []
+    for direction, ray in RAYS[index]:
+        if flat[ray[0]] != opponent:
+            continue
+        for i in range(1, len(ray)):
+            cell = flat[ray[i]]
+            if cell == color:
+                flips.append((direction, ray[:i]))
+                break
+            if cell != opponent:
+                break
+    return flips
+
+
+def iter_flip_lines(
+    flat: list, index: int, color, opponent
+) -> "Iterator[tuple[tuple[int, int], list[int]]]":
+    # find_flips one direction at a time, for callers that can stop early
+    for direction, ray in RAYS[index]:
+        if flat[ray[0]] != opponent:
+            continue
+        for i in range(1, len(ray)):
+            cell = flat[ray[i]]
+            if cell == color:
+                yield direction, ray[:i]
+                break
+            if cell != opponent:
+                break
+
+
+def iter_square_flips(
+    board: list[list], x: int, y: int, color, opponent
+) -> "Iterator[tuple[tuple[int, int], list[tuple[int, int]]]]":
+    # iter_flip_lines for one square, read straight from the board
+    for direction, ray in SQUARE_RAYS[y * 8 + x]:
+        cx, cy = ray[0]
+        if board[cy][cx] != opponent:
+            continue
+        for i in range(1, len(ray)):
+            cx, cy = ray[i]
+            cell = board[cy][cx]
+            if cell == color:
+                yield direction, ray[:i]
+                break
+            if cell != opponent:
+                break
+
+
+def put(board: list[list], x: int, y: int, color, opponent, empty) -> list[list]:
+    if not is_on_board(x, y) or board[y][x] != empty:
+        return board
+
+    flips = list(iter_square_flips(board, x, y, color, opponent))
+    if len(flips) == 0:
+        return board
+
+    board[y][x] = color
+    for _, squares in flips:
+        for cx, cy in squares:
+            board[cy][cx] = color
+
+    return board
+
+
+def get_flip_direction(
+    board: list[list], x: int, y: int, color, opponent, empty
+) -> list[tuple[int, int]]:
+    if board[y][x] != empty:
+        return []
+    return [
+        direction for direction, _ in iter_square_flips(board, x, y, color, opponent)
+    ]
+
+
+def get_flip_positions(
+    board: list[list], color, opponent, empty
+) -> list[tuple[int, int]]:
+    flat = to_flat(board)
+    positions = []
+    for y in range(len(board)):
+        for x in range(len(board[y])):
+            index = to_index(x, y)
+            if (
+                flat[index] == empty
+                and len(find_flips(flat, index, color, opponent)) > 0
+            ):
+                positions.append((x, y))
+    return positions
+
+
+def iter_legal_moves(
+    board: list[list], color, opponent, empty
+) -> "Iterator[tuple[int, int]]":
+    # the moves of get_flip_positions in the same order, each found only
+    # when asked for and checked only up to its first flipping direction
+    flat = to_flat(board)
+    for y in range(8):
+        for x in range(8):
+            index = to_index(x, y)
+            if flat[index] == empty:
+                for _ in iter_flip_lines(flat, index, color, opponent):
+                    yield x, y
+                    break
+
+
+def has_legal_move(board: list[list], color, opponent, empty) -> bool:
+    for _ in iter_legal_moves(board, color, opponent, empty):
+        return True
+    return False
+
+
+def iter_flips(
+    board: list[list], x: int, y: int, color, opponent, empty
+) -> "Iterator[tuple[int, int]]":
+    # the stones a move at (x, y) flips, direction by direction
+    if not is_on_board(x, y) or board[y][x] != empty:
+        return
+    for _, squares in iter_square_flips(board, x, y, color, opponent):
+        yield from squares
+
+
+def safe_input(prompt: str, on_error: "Callable[[], None] | None" = None) -> int:
+    # on_error is called after each error line, e.g. to redraw the screen
+    while True:
+        try:
+            output = input(prompt)
+            return int(output)
+        except Exception as e:
+            print("Invalid input. Please enter a number.")
+            if on_error is not None:
+                on_error()
@@ -1,5 +1,8 @@
 # Othello game implementation without class & GUI
 
+import othello_core
+from othello_core import safe_input
+
 BLACK_CHAR = "○"
 WHITE_CHAR = "●"
 EMPTY_CHAR = "*"
@@ -13,17 +16,7 @@ def flip_color(color: chr) -> chr:
 
 
 def create_board() -> list[list[chr]]:
-    b, w, e = BLACK_CHAR, WHITE_CHAR, EMPTY_CHAR
-    return [
-        [e, e, e, e, e, e, e, e],
-        [e, e, e, e, e, e, e, e],
-        [e, e, e, e, e, e, e, e],
-        [e, e, e, w, b, e, e, e],
-        [e, e, e, b, w, e, e, e],
-        [e, e, e, e, e, e, e, e],
-        [e, e, e, e, e, e, e, e],
-        [e, e, e, e, e, e, e, e],
-    ]
+    return othello_core.create_board(BLACK_CHAR, WHITE_CHAR, EMPTY_CHAR)
 
 
 def print_board(board: list[list[chr]]) -> None:
@@ -42,76 +35,32 @@ def print_board(board: list[list[chr]]) -> None:
     print(f"white ({WHITE_CHAR}): {white_count}")
 
 
-def is_on_board(x: int, y: int) -> bool:
-    return 0 <= x < 8 and 0 <= y < 8
-
-
 def put(board: list[list[chr]], x: int, y: int, color: chr) -> list[list[chr]]:
-    if not is_on_board(x, y) or board[x][y] != EMPTY_CHAR:
-        return board
-
-    directions = get_flip_direction(board, x, y, color)
-    if len(directions) == 0:
-        return board
-
-    board[y][x] = color
-    for dx, dy in directions:
-        for i in range(1, 8):
-            cx = x + dx * i
-            cy = y + dy * i
-            if board[cy][cx] == flip_color(color):
-                board[cy][cx] = color
-            else:
-                break
-
-    return board
+    return othello_core.put(board, x, y, color, flip_color(color), EMPTY_CHAR)
 
 
 def get_flip_direction(
     board: list[list[chr]], x: int, y: int, color: chr
 ) -> list[tuple[int, int]]:
-    directions = []
+    return othello_core.get_flip_direction(
+        board, x, y, color, flip_color(color), EMPTY_CHAR
+    )
 
-    if board[y][x] != EMPTY_CHAR:
-        return directions
 
-    for dx in [-1, 0, 1]:
-        for dy in [-1, 0, 1]:
-            opp_count = 0
-            for i in range(1, 8):
-                cx = x + dx * i
-                cy = y + dy * i
+def get_flip_positions(board: list[list[chr]], color: chr) -> list[tuple[int, int]]:
+    return othello_core.get_flip_positions(board, color, flip_color(color), EMPTY_CHAR)
 
-                if not is_on_board(cx, cy):
-                    break
-                elif board[cy][cx] == EMPTY_CHAR:
-                    break
-                elif board[cy][cx] == flip_color(color):
-                    opp_count += 1
-                else:
-                    if opp_count > 0:
-                        directions.append((dx, dy))
-                    break
 
-    return directions
+def iter_legal_moves(board: list[list[chr]], color: chr):
+    return othello_core.iter_legal_moves(board, color, flip_color(color), EMPTY_CHAR)
 
 
-def get_flip_positions(board: list[list[chr]], color: chr) -> list[tuple[int, int]]:
-    positions = []
-    for y in range(len(board)):
-        for x in range(len(board[y])):
-            if len(get_flip_direction(board, x, y, color)) > 0:
-                positions.append((x, y))
-    return positions
+def has_legal_move(board: list[list[chr]], color: chr) -> bool:
+    return othello_core.has_legal_move(board, color, flip_color(color), EMPTY_CHAR)
 
 
-def safe_input(prompt: str) -> int:
-    while True:
-        try:
-            output = input(prompt)
-            return int(output)
-        except Exception as e:
-            print("Invalid input. Please enter a number.")
+def iter_flips(board: list[list[chr]], x: int, y: int, color: chr):
+    return othello_core.iter_flips(board, x, y, color, flip_color(color), EMPTY_CHAR)
 
 
 def play():
@@ -127,34 +76,26 @@ def play():
         print(f"Current player: {current_player}")
         print_board(board)
 
-        black_flip_pos = get_flip_positions(board, BLACK_CHAR)
-        white_flip_pos = get_flip_positions(board, WHITE_CHAR)
-
-        if len(black_flip_pos) == 0 and len(white_flip_pos) == 0:
-            print("No valid moves for both players. Game over.")
-            break
-
-        if current_color == BLACK_CHAR and len(black_flip_pos) == 0:
-            print("No valid moves for black. Switching to white.")
-            current_color = flip_color(current_color)
-            continue
-        if current_color == WHITE_CHAR and len(white_flip_pos) == 0:
-            print("No valid moves for white. Switching to black.")
+        # only asks whether a move exists, stopping at the first one found
+        if not has_legal_move(board, current_color):
+            if not has_legal_move(board, flip_color(current_color)):
+                print("No valid moves for both players. Game over.")
+                break
+            if current_color == BLACK_CHAR:
+                print("No valid moves for black. Switching to white.")
+            else:
+                print("No valid moves for white. Switching to black.")
             current_color = flip_color(current_color)
             continue
 
-        if current_color == BLACK_CHAR:
-            flip_pos = black_flip_pos
-        else:
-            flip_pos = white_flip_pos
-
         while True:
             x = safe_input("Enter x coordinate (0-7): ")
             y = safe_input("Enter y coordinate (0-7): ")
 
-            if (x, y) in flip_pos:
+            if (x, y) in iter_legal_moves(board, current_color):
                 break
             else:
+                flip_pos = get_flip_positions(board, current_color)
                 print(f"Invalid move. Possible moves: {flip_pos}")
 
         board = put(board, x, y, current_color)
@@ -1,8 +1,10 @@
 # Othello game implementation without class & GUI
 
-import os
-from platform import system
-from ctypes import windll
+import shutil
+import sys
+
+import othello_core
+from othello_core import safe_input
 
 BLACK = 1
 WHITE = 2
@@ -17,37 +19,162 @@ C_RESET_CHAR = "\x1b[39m"
 PIECE_CHAR = "●"
 EMPTY_CHAR = "*"
 
+
 def cursor_hide():
-    print('\033[?25l', end='')
+    print("\033[?25l", end="")
+
 
 def cursor_show():
-    print('\033[?25h', end='')
+    print("\033[?25h", end="")
+
 
 def clear_screen():
     print("\033[;H\033[2J")
 
+
+def setup_console():
+    # the Windows console needs escape sequences turned on; ctypes is only
+    # loaded there, and only when a game is about to be drawn
+    if sys.platform == "win32":
+        from ctypes import windll
+
+        kernel32 = windll.kernel32
+        # ENABLE_PROCESSED_OUTPUT | ENABLE_WRAP_AT_EOL_OUTPUT
+        # | ENABLE_VIRTUAL_TERMINAL_PROCESSING
+        kernel32.SetConsoleMode(kernel32.GetStdHandle(-11), 7)
+
+
 def flip_color(color: int) -> int:
     return WHITE if color == BLACK else BLACK
 
 
 def create_board() -> list[list[int]]:
-    b, w, e = BLACK, WHITE, EMPTY
-    return [
-        [e, e, e, e, e, e, e, e],
-        [e, e, e, e, e, e, e, e],
-        [e, e, e, e, e, e, e, e],
-        [e, e, e, w, b, e, e, e],
-        [e, e, e, b, w, e, e, e],
-        [e, e, e, e, e, e, e, e],
-        [e, e, e, e, e, e, e, e],
-        [e, e, e, e, e, e, e, e],
+    return othello_core.create_board(BLACK, WHITE, EMPTY)
+
+
+# screen layout of a frame: 1-based terminal rows and columns
+COUNT_COLUMN = len(f"black ({PIECE_CHAR}): ") + 1
+BOARD_ROW = 4
+MESSAGE_ROW = BOARD_ROW + 9
+
+# lines below the board in a normal turn: the current player and the two
+# coordinate prompts, with the cursor left on the line after them
+TURN_LINES = 4
+
+# the board on screen after the last print_board call, None when the screen
+# must be redrawn in full
+last_board = None
+
+
+def invalidate_screen() -> None:
+    # once extra lines may have scrolled the terminal, the absolute rows of
+    # the last frame no longer point at the board
+    global last_board
+    last_board = None
+
+
+def move_cursor(row: int, column: int) -> str:
+    return f"\033[{row};{column}H"
+
+
+def cell_char(cell: int) -> tuple[str, str]:
+    if cell == BLACK:
+        return C_BLACK_CHAR, PIECE_CHAR
+    if cell == WHITE:
+        return C_WHITE_CHAR, PIECE_CHAR
+    return C_EMPTY_CHAR, EMPTY_CHAR
+
+
+def count_stones(board: list[list[int]]) -> tuple[int, int]:
+    return (
+        sum([row.count(BLACK) for row in board]),
+        sum([row.count(WHITE) for row in board]),
+    )
+
+
+def render_board(board: list[list[int]]) -> str:
+    # the whole frame, drawn on a cleared screen
+    black, white = count_stones(board)
+    lines = [
+        f"{C_BLACK_CHAR}black ({PIECE_CHAR}): {black}{C_RESET_CHAR}",
+        f"{C_WHITE_CHAR}white ({PIECE_CHAR}): {white}{C_RESET_CHAR}",
+        f"  {C_NUM_CHAR}0 1 2 3 4 5 6 7{C_RESET_CHAR}",
     ]
+    for y in range(len(board)):
+        cells = []
+        for cell in board[y]:
+            color, char = cell_char(cell)
+            cells.append(f"{color}{char}{C_RESET_CHAR}")
+        lines.append(f"{C_NUM_CHAR}{y}{C_RESET_CHAR} " + " ".join(cells))
+    return "\033[?25l\033[;H\033[2J" + "\n".join(lines) + "\n\n\033[?25h"
+
+
+def render_changes(previous: list[list[int]], board: list[list[int]]) -> str:
+    # only the cells and counts that differ from the previous frame, then
+    # the cursor goes back below the board and the old messages are erased
+    parts = ["\033[?25l"]
+    row, column = None, None
+    current_color = None
+
+    for y in range(len(board)):
+        for x in range(len(board[y])):
+            if board[y][x] == previous[y][x]:
+                continue
+            color, char = cell_char(board[y][x])
+            target = BOARD_ROW + y, 3 + 2 * x
+            if (row, column) == (target[0], target[1] - 1):
+                # one cell to the right: rewriting the separator is shorter
+                parts.append(" ")
+            else:
+                parts.append(move_cursor(*target))
+            if color != current_color:
+                parts.append(color)
+                current_color = color
+            parts.append(char)
+            row, column = target[0], target[1] + 1
+
+    counts = count_stones(board)
+    previous_counts = count_stones(previous)
+    for i, color in enumerate((C_BLACK_CHAR, C_WHITE_CHAR)):
+        if counts[i] != previous_counts[i]:
+            parts.append(move_cursor(1 + i, COUNT_COLUMN))
+            if color != current_color:
+                parts.append(color)
+                current_color = color
+            parts.append(f"{counts[i]}\033[K")
+
+    if current_color is not None:
+        parts.append(C_RESET_CHAR)
+    parts.append(move_cursor(MESSAGE_ROW, 1) + "\033[J\033[?25h")
+    return "".join(parts)
+
 
 def print_board(board: list[list[int]]) -> None:
+    global last_board
+    if (
+        last_board is None
+        # a terminal this short scrolls in every turn
+        or shutil.get_terminal_size().lines < MESSAGE_ROW + TURN_LINES
+    ):
+        frame = render_board(board)
+    else:
+        frame = render_changes(last_board, board)
+    last_board = [row[:] for row in board]
+    # one write per frame instead of one per line
+    sys.stdout.write(frame)
+    sys.stdout.flush()
+
+
+def print_board_full(board: list[list[int]]) -> None:
+    # the original renderer: clears the screen and redraws every line
     cursor_hide()
     clear_screen()
-    print(f"{C_BLACK_CHAR}black ({PIECE_CHAR}): {sum([row.count(BLACK) for row in board])}{C_RESET_CHAR}")
-    print(f"{C_WHITE_CHAR}white ({PIECE_CHAR}): {sum([row.count(WHITE) for row in board])}{C_RESET_CHAR}")
+    print(
+        f"{C_BLACK_CHAR}black ({PIECE_CHAR}): {sum([row.count(BLACK) for row in board])}{C_RESET_CHAR}"
+    )
+    print(
+        f"{C_WHITE_CHAR}white ({PIECE_CHAR}): {sum([row.count(WHITE) for row in board])}{C_RESET_CHAR}"
+    )
     print(f"  {C_NUM_CHAR}0 1 2 3 4 5 6 7{C_RESET_CHAR}")
     for y in range(len(board)):
         row = board[y]
@@ -57,7 +184,11 @@ def print_board(board: list[list[int]]) -> None:
                 (
                     f"{C_BLACK_CHAR}{PIECE_CHAR}{C_RESET_CHAR}"
                     if cell == BLACK
-                    else f"{C_WHITE_CHAR}{PIECE_CHAR}{C_RESET_CHAR}" if cell == WHITE else f"{C_EMPTY_CHAR}{EMPTY_CHAR}{C_RESET_CHAR}"
+                    else (
+                        f"{C_WHITE_CHAR}{PIECE_CHAR}{C_RESET_CHAR}"
+                        if cell == WHITE
+                        else f"{C_EMPTY_CHAR}{EMPTY_CHAR}{C_RESET_CHAR}"
+                    )
                 )
                 for cell in row
             )
@@ -65,110 +196,66 @@ def print_board(board: list[list[int]]) -> None:
     print()
     cursor_show()
 
-def is_on_board(x: int, y: int) -> bool:
-    return 0 <= x < 8 and 0 <= y < 8
-
 
 def put(board: list[list[int]], x: int, y: int, color: int) -> list[list[int]]:
-    if not is_on_board(x, y) or board[y][x] != EMPTY:
-        return board
-
-    directions = get_flip_direction(board, x, y, color)
-    if len(directions) == 0:
-        return board
-
-    board[y][x] = color
-    for dx, dy in directions:
-        for i in range(1, 8):
-            cx, cy = x + dx * i, y + dy * i
-            if board[cy][cx] == flip_color(color):
-                board[cy][cx] = color
-            else:
-                break
-
-    return board
+    return othello_core.put(board, x, y, color, flip_color(color), EMPTY)
 
 
 def get_flip_direction(
     board: list[list[int]], x: int, y: int, color: int
 ) -> list[tuple[int, int]]:
-    directions = []
-
-    if board[y][x] != EMPTY:
-        return directions
-
-    for dx in [-1, 0, 1]:
-        for dy in [-1, 0, 1]:
-            opp_count = 0
-            for i in range(1, 8):
-                cx, cy = x + dx * i, y + dy * i
-
-                if not is_on_board(cx, cy):
-                    break
-                elif board[cy][cx] == EMPTY:
-                    break
-                elif board[cy][cx] == flip_color(color):
-                    opp_count += 1
-                else:  # board[cy][cx] == color
-                    if opp_count > 0:
-                        directions.append((dx, dy))
-                    break
-    return directions
+    return othello_core.get_flip_direction(board, x, y, color, flip_color(color), EMPTY)
 
 
 def get_flip_positions(board: list[list[int]], color: int) -> list[tuple[int, int]]:
-    positions = []
-    for y in range(len(board)):
-        for x in range(len(board[y])):
-            if len(get_flip_direction(board, x, y, color)) > 0:
-                positions.append((x, y))
-    return positions
+    return othello_core.get_flip_positions(board, color, flip_color(color), EMPTY)
 
 
-def safe_input(prompt: str) -> int:
-    while True:
-        try:
-            output = input(prompt)
-            return int(output)
-        except Exception as e:
-            print("Invalid input. Please enter a number.")
+def iter_legal_moves(board: list[list[int]], color: int):
+    return othello_core.iter_legal_moves(board, color, flip_color(color), EMPTY)
+
+
+def has_legal_move(board: list[list[int]], color: int) -> bool:
+    return othello_core.has_legal_move(board, color, flip_color(color), EMPTY)
+
+
+def iter_flips(board: list[list[int]], x: int, y: int, color: int):
+    return othello_core.iter_flips(board, x, y, color, flip_color(color), EMPTY)
 
 
 def play():
+    setup_console()
+    # a previous game in this process left its last frame behind
+    invalidate_screen()
     board = create_board()
 
     current_color = BLACK
     while True:
-        print()
-        print(f"Current player: {'black' if current_color == BLACK else 'white'}")
         print_board(board)
+        print(f"Current player: {'black' if current_color == BLACK else 'white'}")
 
-        black_flip_pos = get_flip_positions(board, BLACK)
-        white_flip_pos = get_flip_positions(board, WHITE)
-
-        if len(black_flip_pos) == 0 and len(white_flip_pos) == 0:
-            print("No valid moves for both players. Game over.")
-            break
-
-        if current_color == BLACK and len(black_flip_pos) == 0:
-            print("No valid moves for black. Switching to white.")
-            current_color = flip_color(current_color)
-            continue
-        if current_color == WHITE and len(white_flip_pos) == 0:
-            print("No valid moves for white. Switching to black.")
+        # only asks whether a move exists, stopping at the first one found
+        if not has_legal_move(board, current_color):
+            if not has_legal_move(board, flip_color(current_color)):
+                print("No valid moves for both players. Game over.")
+                break
+            if current_color == BLACK:
+                print("No valid moves for black. Switching to white.")
+            else:
+                print("No valid moves for white. Switching to black.")
             current_color = flip_color(current_color)
             continue
 
-        flip_pos = black_flip_pos if current_color == BLACK else white_flip_pos
-
         while True:
-            x = safe_input("Enter x coordinate (0-7): ")
-            y = safe_input("Enter y coordinate (0-7): ")
+            x = safe_input("Enter x coordinate (0-7): ", invalidate_screen)
+            y = safe_input("Enter y coordinate (0-7): ", invalidate_screen)
 
-            if (x, y) in flip_pos:
+            if (x, y) in iter_legal_moves(board, current_color):
                 break
             else:
+                flip_pos = get_flip_positions(board, current_color)
                 print(f"Invalid move. Possible moves: {flip_pos}")
+                invalidate_screen()
 
         board = put(board, x, y, current_color)
 
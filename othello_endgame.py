@@ -0,0 +1,233 @@
+# Othello endgame solver
+#
+# Exact search to the end of the game for positions with few empty squares.
+# Scores are disc differences counted like print_board: empty squares left at
+# the end of the game are not given to either player.
+
+import time
+
+from othello_bitboard import get_flips, get_moves, to_squares, to_xy
+from othello_withclass import Othello, Stone
+
+# positions with this many empties or fewer are searched square by square
+SHALLOW_EMPTIES = 5
+# positions with more empties than this are kept in the solver's table
+TABLE_EMPTIES = 8
+TABLE_SIZE = 1 << 18
+
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+# quadrant of each square, used for parity move ordering
+QUADRANT = [(square & 7) // 4 + (square >> 3) // 4 * 2 for square in range(64)]
+
+
+class SolverTimeout(Exception):
+    pass
+
+
+class EndgameSolver:
+    def __init__(self, deadline: float | None = None, table_size: int = TABLE_SIZE):
+        self.deadline = deadline
+        self.nodes = 0
+        self.table_size = table_size
+        # (player, opponent) -> (lower bound, upper bound) of the exact score
+        self.table: dict[tuple[int, int], tuple[int, int]] = {}
+
+    def solve_root(
+        self, player: int, opponent: int, alpha: int = -64, beta: int = 64
+    ) -> tuple[int | None, int]:
+        moves = get_moves(player, opponent)
+        if moves == 0:
+            return None, self.solve(player, opponent, alpha, beta)
+
+        best_square, best = None, -65
+        for _, square, next_player, next_opponent in self.order_moves(
+            player, opponent, moves
+        ):
+            score = -self.solve(next_player, next_opponent, -beta, -alpha)
+            if score > best:
+                best_square, best = square, score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best_square, best
+
+    def solve(self, player: int, opponent: int, alpha: int, beta: int) -> int:
+        empties = ~(player | opponent) & 0xFFFFFFFFFFFFFFFF
+        empty_count = empties.bit_count()
+        if empty_count <= SHALLOW_EMPTIES:
+            return self.solve_shallow(
+                player, opponent, alpha, beta, order_by_parity(to_squares(empties))
+            )
+
+        self.nodes += 1
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise SolverTimeout
+
+        moves = get_moves(player, opponent)
+        if moves == 0:
+            if get_moves(opponent, player) == 0:
+                return player.bit_count() - opponent.bit_count()
+            return -self.solve(opponent, player, -beta, -alpha)
+
+        if empty_count <= TABLE_EMPTIES:
+            return self.search(player, opponent, alpha, beta, moves)
+
+        key = (player, opponent)
+        lower, upper = self.table.get(key, (-64, 64))
+        if lower >= beta:
+            return lower
+        if upper <= alpha:
+            return upper
+        alpha, beta = max(alpha, lower), min(beta, upper)
+
+        score = self.search(player, opponent, alpha, beta, moves)
+        if score <= alpha:
+            upper = score
+        elif score >= beta:
+            lower = score
+        else:
+            lower = upper = score
+        if len(self.table) >= self.table_size:
+            self.table.clear()
+        self.table[key] = (lower, upper)
+        return score
+
+    def search(
+        self, player: int, opponent: int, alpha: int, beta: int, moves: int
+    ) -> int:
+        best = -65
+        for _, _, next_player, next_opponent in self.order_moves(
+            player, opponent, moves
+        ):
+            if best == -65:
+                score = -self.solve(next_player, next_opponent, -beta, -alpha)
+            else:
+                # principal variation search: prove the rest are no better
+                score = -self.solve(next_player, next_opponent, -alpha - 1, -alpha)
+                if alpha < score < beta:
+                    score = -self.solve(next_player, next_opponent, -beta, -score)
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best
+
+    def order_moves(
+        self, player: int, opponent: int, moves: int
+    ) -> list[tuple[int, int, int, int]]:
+        # fastest first: the reply that leaves the opponent the fewest moves
+        children = []
+        for square in to_squares(moves):
+            flips = get_flips(player, opponent, square)
+            next_player = opponent & ~flips
+            next_opponent = player | flips | (1 << square)
+            mobility = get_moves(next_player, next_opponent).bit_count()
+            children.append((mobility, square, next_player, next_opponent))
+        children.sort()
+        return children
+
+    def solve_shallow(
+        self,
+        player: int,
+        opponent: int,
+        alpha: int,
+        beta: int,
+        squares: list[int],
+        passed: bool = False,
+    ) -> int:
+        self.nodes += 1
+        if len(squares) == 1:
+            return self.solve_last(player, opponent, squares[0])
+
+        best = -65
+        for i, square in enumerate(squares):
+            flips = get_flips(player, opponent, square)
+            if flips == 0:
+                continue
+            score = -self.solve_shallow(
+                opponent & ~flips,
+                player | flips | (1 << square),
+                -beta,
+                -alpha,
+                squares[:i] + squares[i + 1 :],
+            )
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        if best == -65:
+            if passed:
+                return player.bit_count() - opponent.bit_count()
+            return -self.solve_shallow(opponent, player, -beta, -alpha, squares, True)
+        return best
+
+    def solve_last(self, player: int, opponent: int, square: int) -> int:
+        self.nodes += 1
+        flips = get_flips(player, opponent, square)
+        if flips:
+            return player.bit_count() - opponent.bit_count() + 2 * flips.bit_count() + 1
+        flips = get_flips(opponent, player, square)
+        if flips:
+            return player.bit_count() - opponent.bit_count() - 2 * flips.bit_count() - 1
+        return player.bit_count() - opponent.bit_count()
+
+
+def order_by_parity(squares: list[int]) -> list[int]:
+    # squares in a region with an odd number of empties first
+    counts = [0, 0, 0, 0]
+    for square in squares:
+        counts[QUADRANT[square]] += 1
+    return sorted(squares, key=lambda square: counts[QUADRANT[square]] & 1 == 0)
+
+
+def solve_move(
+    othello: Othello,
+    color: Stone,
+    wld: bool = False,
+    deadline: float | None = None,
+    solver: EndgameSolver | None = None,
+) -> tuple[tuple[int, int] | None, int]:
+    player, opponent = othello.get_bitboards(color)
+    if solver is None:
+        solver = EndgameSolver(deadline)
+    if wld:
+        square, score = solver.solve_root(player, opponent, -1, 1)
+        score = WIN if score > 0 else LOSS if score < 0 else DRAW
+    else:
+        square, score = solver.solve_root(player, opponent)
+    return (to_xy(square) if square is not None else None), score
+
+
+def solve(
+    othello: Othello, color: Stone, deadline: float | None = None
+) -> tuple[tuple[int, int] | None, int, int]:
+    # one solver for the whole line: the bounds stored while solving the
+    # first move cover most of the positions along it
+    solver = EndgameSolver(deadline)
+    move, _ = solve_move(othello, color, solver=solver)
+
+    # follow the perfect line to count the final discs
+    history_size = len(othello.history)
+    next_move, current_color = move, color
+    try:
+        while not othello.is_game_over():
+            if next_move is None:
+                othello.make_pass()
+            else:
+                othello.make_move(*next_move, current_color)
+            current_color = Stone.flip_color(current_color)
+            next_move, _ = solve_move(othello, current_color, solver=solver)
+        black, white = othello.black.bit_count(), othello.white.bit_count()
+    finally:
+        while len(othello.history) > history_size:
+            othello.unmake_move()
+    return move, black, white
@@ -0,0 +1,379 @@
+# Othello computer player
+#
+# negamax alpha-beta search with iterative deepening and a hard time limit
+
+import random
+import threading
+import time
+from typing import Callable
+
+from othello_bitboard import (
+    ZOBRIST_WHITE_TO_MOVE,
+    get_flips,
+    to_positions,
+    to_square,
+    to_xy,
+)
+from othello_endgame import EndgameSolver, SolverTimeout
+from othello_ttable import EXACT, LOWER, NO_MOVE, UPPER, TranspositionTable
+from othello_withclass import Othello, Player, Stone
+
+CORNERS = 0x8100000000000081
+X_SQUARES = 0x0042000000004200  # diagonal neighbors of the corners
+C_SQUARES = 0x4281000000008142  # edge neighbors of the corners
+EDGES = 0xFF818181818181FF & ~(CORNERS | C_SQUARES)
+
+# squares tried first during search: corners, edges, ..., X squares last
+SQUARE_ORDER = [
+    0, 4, 3, 2, 2, 3, 4, 0,
+    4, 5, 3, 3, 3, 3, 5, 4,
+    3, 3, 1, 2, 2, 1, 3, 3,
+    2, 3, 2, 2, 2, 2, 3, 2,
+    2, 3, 2, 2, 2, 2, 3, 2,
+    3, 3, 1, 2, 2, 1, 3, 3,
+    4, 5, 3, 3, 3, 3, 5, 4,
+    0, 4, 3, 2, 2, 3, 4, 0,
+]  # fmt: skip
+
+FINAL_SCALE = 1000  # a won game outscores any heuristic evaluation
+INFINITY = 64 * FINAL_SCALE + 1
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def evaluate(othello: Othello, color: Stone) -> int:
+    player, opponent = othello.get_bitboards(color)
+    player_moves = othello.get_legal_moves(color)
+    opponent_moves = othello.get_legal_moves(Stone.flip_color(color))
+    mobility = player_moves.bit_count() - opponent_moves.bit_count()
+    return (
+        32 * ((player & CORNERS).bit_count() - (opponent & CORNERS).bit_count())
+        - 12 * ((player & X_SQUARES).bit_count() - (opponent & X_SQUARES).bit_count())
+        - 4 * ((player & C_SQUARES).bit_count() - (opponent & C_SQUARES).bit_count())
+        + 2 * ((player & EDGES).bit_count() - (opponent & EDGES).bit_count())
+        + 4 * mobility
+    )
+
+
+def final_score(othello: Othello, color: Stone) -> int:
+    player, opponent = othello.get_bitboards(color)
+    return (player.bit_count() - opponent.bit_count()) * FINAL_SCALE
+
+
+def order_moves(moves: int, first: int = NO_MOVE) -> list[tuple[int, int]]:
+    positions = sorted(
+        to_positions(moves), key=lambda pos: SQUARE_ORDER[to_square(*pos)]
+    )
+    if first != NO_MOVE and moves >> first & 1:
+        positions.remove(to_xy(first))
+        positions.insert(0, to_xy(first))
+    return positions
+
+
+def get_key(othello: Othello, color: Stone) -> int:
+    if color == Stone.WHITE:
+        return othello.hash ^ ZOBRIST_WHITE_TO_MOVE
+    return othello.hash
+
+
+class Engine:
+    def __init__(
+        self,
+        time_limit_ms: int | None = 1000,
+        max_depth: int = 60,
+        table: TranspositionTable | None = None,
+        endgame_empties: int = 12,
+        evaluator: Callable[[Othello, Stone], int] | None = None,
+    ):
+        self.time_limit_ms = time_limit_ms
+        self.max_depth = max_depth
+        self.endgame_empties = endgame_empties
+        self.table = table if table is not None else TranspositionTable()
+        # static evaluation at the horizon, in the units of final_score
+        self.evaluate = evaluator if evaluator is not None else evaluate
+        self.deadline = 0.0
+        self.solver: EndgameSolver | None = None
+        self.nodes = 0
+        self.cutoffs = 0
+        self.depth = 0
+        self.score = 0
+        # called with (depth, nodes) after every completed iteration
+        self.on_depth: Callable[[int, int], None] | None = None
+
+    def stop(self) -> None:
+        # may be called from another thread; the search returns at the next node
+        self.deadline = 0.0
+        if self.solver is not None:
+            self.solver.deadline = 0.0
+
+    def search(self, othello: Othello, color: Stone) -> tuple[int, int] | None:
+        start = time.perf_counter()
+        if self.time_limit_ms is None:
+            self.deadline, endgame_deadline = float("inf"), None
+        else:
+            self.deadline = start + self.time_limit_ms / 1000
+            # the exact solver gets half the budget, the regular search the rest
+            endgame_deadline = start + self.time_limit_ms / 2000
+        self.nodes = 0
+        self.cutoffs = 0
+        self.depth = 0
+        self.score = 0
+        self.table.new_search()
+
+        moves = order_moves(othello.get_legal_moves(color))
+        if len(moves) == 0:
+            return None
+
+        best_move = moves[0]
+        history_size = len(othello.history)
+        empties = 64 - (othello.black | othello.white).bit_count()
+        if empties <= self.endgame_empties:
+            self.solver = EndgameSolver(endgame_deadline)
+            try:
+                square, score = self.solver.solve_root(*othello.get_bitboards(color))
+                self.score, self.depth = score * FINAL_SCALE, empties
+                return to_xy(square)
+            except SolverTimeout:
+                pass
+            finally:
+                self.nodes += self.solver.nodes
+                self.solver = None
+
+        for depth in range(1, min(self.max_depth, empties) + 1):
+            try:
+                move, score = self.search_root(othello, color, depth, moves)
+            except SearchTimeout:
+                while len(othello.history) > history_size:
+                    othello.unmake_move()
+                break
+
+            best_move, self.score, self.depth = move, score, depth
+            moves.remove(move)
+            moves.insert(0, move)
+            if self.on_depth is not None:
+                self.on_depth(depth, self.nodes)
+        return best_move
+
+    def search_root(
+        self, othello: Othello, color: Stone, depth: int, moves: list[tuple[int, int]]
+    ) -> tuple[tuple[int, int], int]:
+        alpha, beta = -INFINITY, INFINITY
+        best_move = moves[0]
+        next_color = Stone.flip_color(color)
+        for x, y in moves:
+            othello.make_move(x, y, color)
+            score = -self.negamax(othello, next_color, depth - 1, -beta, -alpha)
+            othello.unmake_move()
+            if score > alpha:
+                alpha = score
+                best_move = (x, y)
+        return best_move, alpha
+
+    def negamax(
+        self, othello: Othello, color: Stone, depth: int, alpha: int, beta: int
+    ) -> int:
+        self.nodes += 1
+        if time.perf_counter() >= self.deadline:
+            raise SearchTimeout
+
+        next_color = Stone.flip_color(color)
+        moves = othello.get_legal_moves(color)
+        if moves == 0:
+            # the full mask, not has_legal_move: the child needs it anyway and
+            # a pass keeps the cache
+            if not othello.get_legal_moves(next_color):
+                return final_score(othello, color)
+            othello.make_pass()
+            score = -self.negamax(othello, next_color, depth, -beta, -alpha)
+            othello.unmake_move()
+            return score
+
+        if depth == 0:
+            return self.evaluate(othello, color)
+
+        key = get_key(othello, color)
+        entry = self.table.probe(key)
+        table_move = NO_MOVE
+        if entry is not None:
+            entry_depth, bound, score, table_move = entry
+            if entry_depth >= depth and (
+                bound == EXACT
+                or (bound == LOWER and score >= beta)
+                or (bound == UPPER and score <= alpha)
+            ):
+                return score
+
+        original_alpha = alpha
+        best = -INFINITY
+        best_move = NO_MOVE
+        for x, y in order_moves(moves, table_move):
+            othello.make_move(x, y, color)
+            score = -self.negamax(othello, next_color, depth - 1, -beta, -alpha)
+            othello.unmake_move()
+            if score > best:
+                best = score
+                best_move = to_square(x, y)
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        self.cutoffs += 1
+                        break
+
+        if best <= original_alpha:
+            bound = UPPER
+        elif best >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.table.store(key, depth, bound, best, best_move)
+        return best
+
+
+class EnginePlayer(Player):
+    def __init__(
+        self,
+        time_limit_ms: int | None = 1000,
+        max_depth: int = 60,
+        table_size: int = 1 << 18,
+        endgame_empties: int = 12,
+        evaluator: Callable[[Othello, Stone], int] | None = None,
+    ):
+        self.engine = Engine(
+            time_limit_ms,
+            max_depth,
+            TranspositionTable(table_size),
+            endgame_empties,
+            evaluator,
+        )
+
+    def get_move(self, othello: Othello, color: Stone) -> tuple[int, int]:
+        return self.engine.search(othello, color)
+
+    def stop(self) -> None:
+        self.engine.stop()
+
+
+class PonderingPlayer(EnginePlayer):
+    # While the opponent thinks, a background thread searches the position
+    # after each of its likely replies, most likely first, with the normal
+    # time limit. When the real reply was among them the move is returned at
+    # once; otherwise the ponder search is stopped and the regular search
+    # starts with a transposition table the ponder has already filled.
+
+    def __init__(
+        self,
+        time_limit_ms: int | None = 1000,
+        max_depth: int = 60,
+        table_size: int = 1 << 18,
+        endgame_empties: int = 12,
+        evaluator: Callable[[Othello, Stone], int] | None = None,
+    ):
+        super().__init__(
+            time_limit_ms, max_depth, table_size, endgame_empties, evaluator
+        )
+        # position key -> (move, depth, score) of finished ponder searches
+        self.cache: dict[int, tuple[tuple[int, int], int, int]] = {}
+        self.thread: threading.Thread | None = None
+        self.pondering = False
+        self.interrupted = False
+        self.ponder_key: int | None = None
+        self.hits = 0
+        self.misses = 0
+
+    def ponder(self, othello: Othello, color: Stone) -> None:
+        self.stop_pondering()
+        self.cache.clear()
+        self.pondering = True
+        self.interrupted = False
+        self.thread = threading.Thread(
+            target=self.ponder_replies, args=(othello.copy(), color), daemon=True
+        )
+        self.thread.start()
+
+    def ponder_replies(self, othello: Othello, color: Stone) -> None:
+        opponent = Stone.flip_color(color)
+        entry = self.engine.table.probe(get_key(othello, opponent))
+        replies = order_moves(
+            othello.get_legal_moves(opponent), entry[3] if entry else NO_MOVE
+        )
+        for x, y in replies:
+            if not self.pondering:
+                break
+            othello.make_move(x, y, opponent)
+            key = get_key(othello, color)
+            self.ponder_key = key
+            move = self.engine.search(othello, color)
+            if move is not None and not self.interrupted:
+                self.cache[key] = (move, self.engine.depth, self.engine.score)
+            othello.unmake_move()
+        self.ponder_key = None
+
+    def stop_pondering(
+        self, othello: Othello | None = None, color: Stone | None = None
+    ) -> None:
+        # the worker and the GUI thread may both stop the same ponder, so
+        # only the local reference is used and cleared if still current
+        thread = self.thread
+        if thread is None:
+            return
+        self.pondering = False
+        if othello is not None and get_key(othello, color) == self.ponder_key:
+            # the ponder is searching the actual position: let it finish
+            # within its own deadline, then stop before the next reply
+            thread.join()
+        while thread.is_alive():
+            # repeated in case the search had not set its deadline yet
+            self.interrupted = True
+            self.engine.stop()
+            thread.join(0.01)
+        if self.thread is thread:
+            self.thread = None
+
+    def close(self) -> None:
+        self.stop_pondering()
+
+    def is_pondering(self, othello: Othello, color: Stone) -> bool:
+        thread = self.thread
+        return (
+            thread is not None
+            and thread.is_alive()
+            and self.ponder_key == get_key(othello, color)
+        )
+
+    def get_move(self, othello: Othello, color: Stone) -> tuple[int, int]:
+        self.stop_pondering(othello, color)
+        key = get_key(othello, color)
+        if key in self.cache:
+            self.hits += 1
+            move, self.engine.depth, self.engine.score = self.cache[key]
+            self.engine.nodes = 0
+            return move
+        self.misses += 1
+        return self.engine.search(othello, color)
+
+
+class RandomPlayer(Player):
+    def __init__(self, seed: int | None = None):
+        self.random = random.Random(seed)
+
+    def get_move(self, othello: Othello, color: Stone) -> tuple[int, int]:
+        return self.random.choice(othello.get_flip_positions(color))
+
+
+class GreedyPlayer(Player):
+    def __init__(self, seed: int | None = None):
+        self.random = random.Random(seed)
+
+    def get_move(self, othello: Othello, color: Stone) -> tuple[int, int]:
+        # the move that flips the most stones, ties broken at random
+        player, opponent = othello.get_bitboards(color)
+        moves = othello.get_flip_positions(color)
+        counts = [
+            get_flips(player, opponent, to_square(x, y)).bit_count() for x, y in moves
+        ]
+        best = max(counts)
+        return self.random.choice(
+            [move for move, count in zip(moves, counts) if count == best]
+        )
@@ -1,271 +1,223 @@
-import os
 import sys
-import pygame
-from pygame.locals import *
+from typing import TYPE_CHECKING
 
+import othello_withclass
+from othello_bitboard import to_squares, to_xy
+from othello_withclass import Stone
+from othello_worker import MoveWorker
 
-from enum import Enum
-from typing import Self
+if TYPE_CHECKING:
+    import pygame
 
+    from othello_book import OpeningBook
 
-def safe_input(prompt: str) -> int:
-    while True:
-        try:
-            output = input(prompt)
-            return int(output)
-        except Exception as e:
-            print("Invalid input. Please enter a number.")
 
+TILE_SIZE = 100
 
-class Stone(Enum):
-    BLACK = 1
-    WHITE = 2
-    EMPTY = 0
 
-    @classmethod
-    def flip_color(cls, color: int) -> int:
-        return cls.WHITE if color == cls.BLACK else cls.BLACK
-
-    @classmethod
-    def get_char(cls, color: Self) -> str:
-        if color == cls.BLACK:
-            return "○"
-        elif color == cls.WHITE:
-            return "●"
-        else:
-            return "*"
+def import_pygame() -> None:
+    # pygame is only loaded once a window is opened, so that --help, option
+    # errors and worker processes that import this module stay light
+    global pygame
+    import pygame
 
 
-class Othello:
+class Othello(othello_withclass.Othello):
     def __init__(self):
-        self.board = self.create_board()
+        super().__init__()
 
+        import_pygame()
         pygame.init()
 
-        self.screen = pygame.display.set_mode((800, 800))
+        self.screen = pygame.display.set_mode((TILE_SIZE * 8, TILE_SIZE * 8))
         pygame.display.set_caption("Othello")
-        self.clock = pygame.time.Clock()
+        # only wake up for events that can change what is on screen
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed(
+            [
+                pygame.QUIT,
+                pygame.MOUSEBUTTONDOWN,
+                pygame.KEYDOWN,
+                pygame.VIDEOEXPOSE,
+                pygame.WINDOWEXPOSED,
+            ]
+        )
+        self.sprites = self.create_sprites()
+
+    def create_sprites(self) -> dict[Stone, "pygame.Surface"]:
+        sprites = {}
+        for stone, color in (
+            (Stone.EMPTY, None),
+            (Stone.BLACK, (0, 0, 0)),
+            (Stone.WHITE, (255, 255, 255)),
+        ):
+            sprite = pygame.Surface((TILE_SIZE, TILE_SIZE)).convert()
+            sprite.fill((0, 0, 0))
+            pygame.draw.rect(sprite, (0, 128, 0), (1, 1, TILE_SIZE - 2, TILE_SIZE - 2))
+            if color is not None:
+                pygame.draw.circle(
+                    sprite,
+                    color,
+                    (TILE_SIZE // 2, TILE_SIZE // 2),
+                    TILE_SIZE // 2 - 5,
+                )
+            sprites[stone] = sprite
+        return sprites
+
+    def draw_square(self, square: int) -> "pygame.Rect":
+        x, y = to_xy(square)
+        bit = 1 << square
+        if self.black & bit:
+            stone = Stone.BLACK
+        elif self.white & bit:
+            stone = Stone.WHITE
+        else:
+            stone = Stone.EMPTY
+        return self.screen.blit(self.sprites[stone], (x * TILE_SIZE, y * TILE_SIZE))
 
-    def create_board(self) -> list[list[Stone]]:
-        b, w, e = Stone.BLACK, Stone.WHITE, Stone.EMPTY
-        return [
-            [e, e, e, e, e, e, e, e],
-            [e, e, e, e, e, e, e, e],
-            [e, e, e, e, e, e, e, e],
-            [e, e, e, w, b, e, e, e],
-            [e, e, e, b, w, e, e, e],
-            [e, e, e, e, e, e, e, e],
-            [e, e, e, e, e, e, e, e],
-            [e, e, e, e, e, e, e, e],
-        ]
+    def draw_board(self):
+        for square in range(64):
+            self.draw_square(square)
+        pygame.display.update()
 
-    def print_board(self) -> None:
-        print(
-            f"black ({Stone.get_char(Stone.BLACK)}): {sum([row.count(Stone.BLACK) for row in self.board])}"
+    def draw_squares(self, squares: int) -> None:
+        pygame.display.update(
+            [self.draw_square(square) for square in to_squares(squares)]
         )
-        print(
-            f"white ({Stone.get_char(Stone.WHITE)}): {sum([row.count(Stone.WHITE) for row in self.board])}"
-        )
-        print("  0 1 2 3 4 5 6 7")
-        for y in range(len(self.board)):
-            row = self.board[y]
-            print(f"{y} " + " ".join([Stone.get_char(cell) for cell in row]))
-        print()
-
-    def is_on_board(self, x: int, y: int) -> bool:
-        return 0 <= x < 8 and 0 <= y < 8
 
     def put(self, x: int, y: int, color: Stone):
-        if not self.is_on_board(x, y) or self.board[y][x] != Stone.EMPTY:
-            return
-
-        directions = self.get_flip_direction(x, y, color)
-        if len(directions) == 0:
-            return
-
-        self.board[y][x] = color
-        for dx, dy in directions:
-            for i in range(1, 8):
-                cx, cy = x + dx * i, y + dy * i
-                if self.board[cy][cx] == Stone.flip_color(color):
-                    self.board[cy][cx] = color
-                else:
-                    break
-
-    def get_flip_direction(self, x: int, y: int, color: Stone) -> list[tuple[int, int]]:
-        directions = []
-
-        if self.board[y][x] != Stone.EMPTY:
-            return directions
+        history_size = len(self.history)
+        super().put(x, y, color)
+        if len(self.history) > history_size:
+            square, flips = self.history[-1]
+            self.draw_squares(flips | (1 << square))
 
-        for dx in [-1, 0, 1]:
-            for dy in [-1, 0, 1]:
-                opp_count = 0
-                for i in range(1, 8):
-                    cx, cy = x + dx * i, y + dy * i
+    def to_click_pos(self, pos: tuple[int, int]) -> tuple[int, int]:
+        x = pos[0] // TILE_SIZE
+        y = pos[1] // TILE_SIZE
+        return x, y
 
-                    if not self.is_on_board(cx, cy):
-                        break
-                    elif self.board[cy][cx] == Stone.EMPTY:
-                        break
-                    elif self.board[cy][cx] == Stone.flip_color(color):
-                        opp_count += 1
-                    else:  # board[cy][cx] == color
-                        if opp_count > 0:
-                            directions.append((dx, dy))
-                        break
-        return directions
+    def handle_common_event(
+        self, event: "pygame.event.Event", workers: list[MoveWorker] = ()
+    ) -> None:
+        if event.type == pygame.QUIT:
+            for worker in workers:
+                worker.cancel()
+            pygame.quit()
+            sys.exit()
+        if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+            self.draw_board()
 
-    def get_flip_positions(self, color: Stone) -> list[tuple[int, int]]:
-        positions = []
-        for y in range(len(self.board)):
-            for x in range(len(self.board[y])):
-                if len(self.get_flip_direction(x, y, color)) > 0:
-                    positions.append((x, y))
-        return positions
+    def play_gui(
+        self,
+        black: othello_withclass.Player | None = None,
+        white: othello_withclass.Player | None = None,
+        book: "OpeningBook | None" = None,
+        worker: str = "thread",
+    ):
+        # computer moves run in a MoveWorker so the window keeps handling
+        # events; press R to cancel any search and start a new game
+        workers = {
+            color: MoveWorker(player, worker)
+            for color, player in ((Stone.BLACK, black), (Stone.WHITE, white))
+            if player is not None
+        }
+        all_workers = list(workers.values())
 
-    def play(self):
+        while True:
+            restart = self.play_gui_game(workers, book)
+            # after a game ends, wait on the final position until R is pressed
+            while not restart:
+                event = pygame.event.wait()
+                self.handle_common_event(event, all_workers)
+                restart = event.type == pygame.KEYDOWN and event.key == pygame.K_r
+
+    def play_gui_game(
+        self, workers: dict[Stone, MoveWorker], book: "OpeningBook | None"
+    ) -> bool:
         self.board = self.create_board()
+        self.draw_board()
+        pygame.display.set_caption("Othello")
+        all_workers = list(workers.values())
 
         current_color = Stone.BLACK
         while True:
-            print()
-            print(
-                f"Current player: {'black' if current_color == Stone.BLACK else 'white'}"
-            )
-            self.print_board()
-
-            black_flip_pos = self.get_flip_positions(Stone.BLACK)
-            white_flip_pos = self.get_flip_positions(Stone.WHITE)
-
-            if len(black_flip_pos) == 0 and len(white_flip_pos) == 0:
-                print("No valid moves for both players. Game over.")
-                break
-
-            if current_color == Stone.BLACK and len(black_flip_pos) == 0:
-                print("No valid moves for black. Switching to white.")
-                current_color = Stone.flip_color(current_color)
-                continue
-            if current_color == Stone.WHITE and len(white_flip_pos) == 0:
-                print("No valid moves for white. Switching to black.")
+            if not self.has_legal_move(current_color):
+                if not self.has_legal_move(Stone.flip_color(current_color)):
+                    print("No valid moves for both players. Game over.")
+                    for worker in all_workers:
+                        worker.cancel()
+                    return False
+                if current_color == Stone.BLACK:
+                    print("No valid moves for black. Switching to white.")
+                else:
+                    print("No valid moves for white. Switching to black.")
                 current_color = Stone.flip_color(current_color)
                 continue
 
-            flip_pos = (
-                black_flip_pos if current_color == Stone.BLACK else white_flip_pos
-            )
-
-            while True:
-                x = safe_input("Enter x coordinate (0-7): ")
-                y = safe_input("Enter y coordinate (0-7): ")
-
-                if (x, y) in flip_pos:
-                    break
+            move = None
+
+            worker = workers.get(current_color)
+            if worker is not None:
+                if not worker.is_running():
+                    if book is not None:
+                        move = book.lookup(self, current_color)
+                    if move is None:
+                        worker.start(self, current_color)
+                if move is None:
+                    move = worker.poll()
+                    if move is None:
+                        name = "black" if current_color == Stone.BLACK else "white"
+                        pygame.display.set_caption(
+                            f"Othello - {name} thinking: depth {worker.depth}, "
+                            f"{worker.nodes} nodes"
+                        )
+                        # poll the worker between events
+                        event = pygame.event.wait(50)
+                    else:
+                        pygame.display.set_caption("Othello")
+                        event = pygame.event.poll()
                 else:
-                    print(f"Invalid move. Possible moves: {flip_pos}")
-
-            self.put(x, y, current_color)
-            current_color = Stone.flip_color(current_color)
-
-    def draw_board(self):
-        self.screen.fill((0, 0, 0))
-        tile_size = 100
-
-        board_rect = pygame.Surface((tile_size * 8, tile_size * 8), masks=(0, 0, 0))
-
-        for y in range(8):
-            for x in range(8):
-                pygame.draw.rect(
-                    board_rect,
-                    (0, 128, 0),
-                    (
-                        x * tile_size + 1,
-                        y * tile_size + 1,
-                        tile_size - 2,
-                        tile_size - 2,
-                    ),
-                )
-                if self.board[y][x] == Stone.BLACK:
-                    pygame.draw.circle(
-                        board_rect,
-                        (0, 0, 0),
-                        (
-                            x * tile_size + tile_size // 2,
-                            y * tile_size + tile_size // 2,
-                        ),
-                        tile_size // 2 - 5,
-                    )
-                elif self.board[y][x] == Stone.WHITE:
-                    pygame.draw.circle(
-                        board_rect,
-                        (255, 255, 255),
-                        (
-                            x * tile_size + tile_size // 2,
-                            y * tile_size + tile_size // 2,
-                        ),
-                        tile_size // 2 - 5,
-                    )
-
-        self.screen.blit(board_rect, (0, 0))
-
-    def to_click_pos(self, pos: tuple[int, int]) -> tuple[int, int]:
-        tile_size = 100
-        x = pos[0] // tile_size
-        y = pos[1] // tile_size
-        return x, y
-
-    def play_gui(self):
-        self.board = self.create_board()
-
-        current_color = Stone.BLACK
-        while True:
-            self.draw_board()
-            pygame.display.update()
-            self.clock.tick(60)
-
-            black_flip_pos = self.get_flip_positions(Stone.BLACK)
-            white_flip_pos = self.get_flip_positions(Stone.WHITE)
-
-            if len(black_flip_pos) == 0 and len(white_flip_pos) == 0:
-                print("No valid moves for both players. Game over.")
-                break
-
-            if current_color == Stone.BLACK and len(black_flip_pos) == 0:
-                print("No valid moves for black. Switching to white.")
+                    event = pygame.event.poll()
+            else:
+                # sleep until something happens instead of redrawing every frame
+                event = pygame.event.wait()
+
+            self.handle_common_event(event, all_workers)
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_r:
+                for worker in all_workers:
+                    worker.cancel()
+                return True
+            if move is not None:
+                x, y = move
+                self.put(x, y, current_color)
+                worker.ponder(self, current_color)
                 current_color = Stone.flip_color(current_color)
                 continue
-            if current_color == Stone.WHITE and len(white_flip_pos) == 0:
-                print("No valid moves for white. Switching to black.")
-                current_color = Stone.flip_color(current_color)
-                continue
-
-            flip_pos = (
-                black_flip_pos if current_color == Stone.BLACK else white_flip_pos
-            )
 
-            for event in pygame.event.get():
-                if event.type == QUIT:
-                    pygame.quit()
-                    sys.exit()
-                if event.type == MOUSEBUTTONDOWN:
-                    if event.button == 1:
-                        x, y = self.to_click_pos(event.pos)
-                        if (x, y) in flip_pos:
-                            self.put(x, y, current_color)
-                            current_color = Stone.flip_color(current_color)
-                        else:
-                            print(f"Invalid move. Possible moves: {flip_pos}")
-
-        while True:
-            self.draw_board()
-            pygame.display.update()
-            self.clock.tick(60)
-            for event in pygame.event.get():
-                if event.type == QUIT:
-                    pygame.quit()
-                    sys.exit()
+            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                if current_color in workers:
+                    print("Wait for the computer to move.")
+                else:
+                    x, y = self.to_click_pos(event.pos)
+                    if (x, y) in self.iter_legal_moves(current_color):
+                        self.put(x, y, current_color)
+                        current_color = Stone.flip_color(current_color)
+                    else:
+                        flip_pos = self.get_flip_positions(current_color)
+                        print(f"Invalid move. Possible moves: {flip_pos}")
 
 
 if __name__ == "__main__":
+    options = othello_withclass.parse_options("Othello (GUI)", gui=True)
+    profile = options.pop("profile", None)
     game = Othello()
-    game.play_gui()
+    try:
+        if profile is None:
+            game.play_gui(**options)
+        else:
+            from othello_profile import profile_game
+
+            profile_game(game, game.play_gui, options, **profile)
+    finally:
+        othello_withclass.close_players(options)
@@ -0,0 +1,259 @@
+# Monte Carlo tree search player
+#
+# UCT over bitboard positions with uniformly random playouts. The tree is
+# kept between moves: the next search starts from the node of the position
+# actually reached, and everything else is freed. With workers > 1 every
+# process searches its own tree from the same root and the visit counts of
+# the root moves are added up (root parallelism).
+
+import math
+import os
+import random
+import time
+from multiprocessing import Pool, RawValue
+
+from othello_bitboard import PASS, get_flips, get_moves, to_xy
+from othello_withclass import Othello, Player, Stone
+from othello_worker import restore_default_sigterm
+
+
+class Node:
+    # player and opponent are the bitboards of the side to move; wins counts
+    # results for the side that moved into this node (1 win, 0.5 draw)
+    __slots__ = ("player", "opponent", "move", "untried", "children", "visits", "wins")
+
+    def __init__(self, player: int, opponent: int, move: int):
+        self.player = player
+        self.opponent = opponent
+        self.move = move
+        self.untried = get_moves(player, opponent)
+        self.children: list[Node] = []
+        self.visits = 0
+        self.wins = 0.0
+        if self.untried == 0 and get_moves(opponent, player) != 0:
+            # the only move is a pass
+            self.children.append(Node(opponent, player, PASS))
+
+
+def playout(player: int, opponent: int, rng: random.Random) -> int:
+    # plays random moves to the end; the final disc difference for the side
+    # to move at the start
+    sign = 1
+    passed = False
+    while True:
+        moves = get_moves(player, opponent)
+        if moves == 0:
+            if passed:
+                break
+            passed = True
+        else:
+            passed = False
+            for _ in range(rng.randrange(moves.bit_count())):
+                moves &= moves - 1
+            bit = moves & -moves
+            flips = get_flips(player, opponent, bit.bit_length() - 1)
+            player |= flips | bit
+            opponent ^= flips
+        player, opponent = opponent, player
+        sign = -sign
+    return sign * (player.bit_count() - opponent.bit_count())
+
+
+def count_nodes(node: Node) -> int:
+    count, stack = 0, [node]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.children)
+    return count
+
+
+class MCTS:
+    def __init__(
+        self,
+        exploration: float = 1.4,
+        max_nodes: int = 1 << 20,
+        seed: int | None = None,
+    ):
+        self.exploration = exploration
+        self.max_nodes = max_nodes
+        self.random = random.Random(seed)
+        self.root: Node | None = None
+        self.size = 0
+        self.playouts = 0
+
+    def set_root(self, player: int, opponent: int) -> None:
+        # reuse the subtree of the position if the last search reached it
+        # within a few plies (our move, passes and the opponent's reply)
+        if self.root is not None:
+            level = [self.root]
+            for _ in range(4):
+                for node in level:
+                    if node.player == player and node.opponent == opponent:
+                        self.root = node
+                        self.size = count_nodes(node)
+                        return
+                level = [child for node in level for child in node.children]
+        self.root = Node(player, opponent, PASS)
+        self.size = 1
+
+    def search(
+        self, deadline: float | None = None, playouts: int | None = None, stop=None
+    ) -> None:
+        # stops at the deadline (perf_counter time), after `playouts`
+        # iterations or once stop.value is set, whichever comes first; at
+        # least one iteration either way
+        self.playouts = 0
+        while True:
+            self.iterate()
+            self.playouts += 1
+            if playouts is not None and self.playouts >= playouts:
+                return
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            if stop is not None and stop.value:
+                return
+
+    def iterate(self) -> None:
+        node = self.root
+        path = [node]
+        log, sqrt, exploration = math.log, math.sqrt, self.exploration
+
+        # selection: descend through fully expanded nodes
+        while node.untried == 0 and node.children:
+            log_visits = log(max(node.visits, 1))
+            best, best_value = None, -1.0
+            for child in node.children:
+                if child.visits == 0:
+                    best = child
+                    break
+                value = child.wins / child.visits + exploration * sqrt(
+                    log_visits / child.visits
+                )
+                if value > best_value:
+                    best, best_value = child, value
+            node = best
+            path.append(node)
+
+        # expansion: one random untried move, while the node budget lasts
+        if node.untried and self.size < self.max_nodes:
+            moves = node.untried
+            for _ in range(self.random.randrange(moves.bit_count())):
+                moves &= moves - 1
+            bit = moves & -moves
+            node.untried ^= bit
+            square = bit.bit_length() - 1
+            flips = get_flips(node.player, node.opponent, square)
+            child = Node(node.opponent & ~flips, node.player | flips | bit, square)
+            node.children.append(child)
+            self.size += 1 + len(child.children)
+            node = child
+            path.append(node)
+
+        # simulation, then backpropagation with alternating sides
+        difference = playout(node.player, node.opponent, self.random)
+        result = 0.5 if difference == 0 else 0.0 if difference > 0 else 1.0
+        for node in reversed(path):
+            node.visits += 1
+            node.wins += result
+            result = 1.0 - result
+
+    def root_visits(self) -> dict[int, int]:
+        return {child.move: child.visits for child in self.root.children}
+
+
+# one tree per worker process, kept between moves like the single-process one
+tree: MCTS | None = None
+# set by MCTSPlayer.stop, shared with the player's process
+stop_flag = None
+
+
+def create_tree(exploration: float, max_nodes: int, seed: int | None, stop) -> None:
+    global tree, stop_flag
+    restore_default_sigterm()
+    worker_seed = None if seed is None else seed ^ os.getpid()
+    tree = MCTS(exploration, max_nodes, worker_seed)
+    stop_flag = stop
+
+
+def search_in_worker(
+    task: tuple[int, int, float | None, int | None],
+) -> tuple[dict[int, int], int]:
+    player, opponent, deadline, playouts = task
+    tree.set_root(player, opponent)
+    tree.search(deadline, playouts, stop_flag)
+    return tree.root_visits(), tree.playouts
+
+
+class MCTSPlayer(Player):
+    def __init__(
+        self,
+        time_limit_ms: int | None = 1000,
+        playouts: int | None = None,
+        max_nodes: int = 1 << 20,
+        workers: int = 1,
+        exploration: float = 1.4,
+        seed: int | None = None,
+    ):
+        if time_limit_ms is None and playouts is None:
+            raise ValueError("MCTSPlayer needs a time limit or a playout budget")
+        self.time_limit_ms = time_limit_ms
+        self.playouts = playouts
+        self.workers = workers
+        self.tree = MCTS(exploration, max_nodes, seed)
+        # started by the first search that needs it
+        self.pool = None
+        # one byte in shared memory, so that stop() also reaches the workers
+        self.stop_flag = RawValue("b", 0)
+        self.pool_args = (exploration, max_nodes, seed, self.stop_flag)
+        # statistics of the last search, summed over workers
+        self.last_playouts = 0
+
+    def get_move(self, othello: Othello, color: Stone) -> tuple[int, int]:
+        player, opponent = othello.get_bitboards(color)
+        self.stop_flag.value = 0
+        # one absolute deadline for the whole move: perf_counter is the same
+        # clock in the workers, so starting the pool and waiting in its queue
+        # are counted against the time limit
+        deadline = None
+        if self.time_limit_ms is not None:
+            deadline = time.perf_counter() + self.time_limit_ms / 1000
+        if self.workers == 1:
+            self.tree.set_root(player, opponent)
+            self.tree.search(deadline, self.playouts, self.stop_flag)
+            visits = self.tree.root_visits()
+            self.last_playouts = self.tree.playouts
+        else:
+            playouts = None
+            if self.playouts is not None:
+                playouts = max(1, self.playouts // self.workers)
+            task = (player, opponent, deadline, playouts)
+            if self.pool is None:
+                self.pool = Pool(self.workers, create_tree, self.pool_args)
+            visits = {}
+            self.last_playouts = 0
+            # chunksize=1 does not pin one task to each process: a worker that
+            # finishes early may take a second task while another idles. Every
+            # task stops at the same absolute deadline (or its share of the
+            # playouts), so the move still takes the time limit, just with
+            # fewer playouts
+            for worker_visits, count in self.pool.map(
+                search_in_worker, [task] * self.workers, chunksize=1
+            ):
+                for move, n in worker_visits.items():
+                    visits[move] = visits.get(move, 0) + n
+                self.last_playouts += count
+
+        moves = [move for move in visits if move != PASS]
+        if len(moves) == 0:
+            # not searched yet: any legal move
+            return othello.get_flip_positions(color)[0]
+        return to_xy(max(moves, key=visits.get))
+
+    def stop(self) -> None:
+        self.stop_flag.value = 1
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
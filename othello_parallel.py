@@ -0,0 +1,260 @@
+# Multi-process alpha-beta search
+#
+# The root moves of every iteration are split over a pool of worker
+# processes, each with its own transposition table. Young brothers wait:
+# the first move, the best one of the previous iteration, is searched alone
+# with the full window, and only then are the other moves handed out, so
+# they start with its score as alpha. The best root score found so far
+# lives in shared memory; a worker narrows the window of the position it is
+# searching before each reply it tries, so a move that can no longer beat
+# another worker's result is cut off without waiting for the whole subtree.
+# stop() reaches the workers through a second shared flag, checked at every
+# node next to the deadline.
+#
+# usage: python othello_bench.py parallel --workers N
+
+import os
+from multiprocessing import Pool, RawValue, Value
+from typing import Callable
+
+from othello_bitboard import to_square
+from othello_engine import (
+    INFINITY,
+    Engine,
+    EnginePlayer,
+    SearchTimeout,
+    get_key,
+    order_moves,
+)
+from othello_ttable import EXACT, LOWER, NO_MOVE, UPPER, TranspositionTable
+from othello_withclass import Othello, Stone
+from othello_worker import restore_default_sigterm
+
+# one engine and one board per worker process, the table kept between tasks
+engine: "WorkerEngine | None" = None
+position: Othello | None = None
+# the best root score of the current iteration, shared by all workers
+root_alpha = None
+# set by ParallelEngine.stop, which cannot reach the workers' deadlines
+stop_flag = None
+
+
+class WorkerEngine(Engine):
+    def negamax(
+        self, othello: Othello, color: Stone, depth: int, alpha: int, beta: int
+    ) -> int:
+        if stop_flag.value:
+            raise SearchTimeout
+        return super().negamax(othello, color, depth, alpha, beta)
+
+
+def create_engine(alpha, stop, table_size: int, evaluator) -> None:
+    global engine, position, root_alpha, stop_flag
+    restore_default_sigterm()
+    engine = WorkerEngine(
+        None, table=TranspositionTable(table_size), evaluator=evaluator
+    )
+    position = Othello()
+    root_alpha = alpha
+    stop_flag = stop
+
+
+def raise_root_alpha(score: int) -> None:
+    with root_alpha.get_lock():
+        if score > root_alpha.value:
+            root_alpha.value = score
+
+
+def search_reply(
+    othello: Othello, color: Stone, depth: int, alpha: int
+) -> tuple[int, int]:
+    # negamax for the position after a root move, with beta following the
+    # shared root alpha instead of staying fixed; also returns the final
+    # beta, since a score at or above it is only a bound. Beta stays one
+    # above, so a move that ties the best one still gets an exact score and
+    # the root can prefer the earlier of the two, as the serial search does
+    moves = othello.get_legal_moves(color)
+    beta = 1 - root_alpha.value
+    if depth == 0 or moves == 0:
+        return engine.negamax(othello, color, depth, alpha, beta), beta
+
+    engine.nodes += 1
+    key = get_key(othello, color)
+    entry = engine.table.probe(key)
+    table_move = NO_MOVE
+    if entry is not None:
+        entry_depth, bound, score, table_move = entry
+        if entry_depth >= depth and (
+            bound == EXACT
+            or (bound == LOWER and score >= beta)
+            or (bound == UPPER and score <= alpha)
+        ):
+            return score, beta
+
+    original_alpha = alpha
+    best = -INFINITY
+    best_move = NO_MOVE
+    next_color = Stone.flip_color(color)
+    for x, y in order_moves(moves, table_move):
+        beta = min(beta, 1 - root_alpha.value)
+        if best >= beta:
+            # another worker found a better root move
+            engine.cutoffs += 1
+            break
+        othello.make_move(x, y, color)
+        score = -engine.negamax(othello, next_color, depth - 1, -beta, -alpha)
+        othello.unmake_move()
+        if score > best:
+            best = score
+            best_move = to_square(x, y)
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    engine.cutoffs += 1
+                    break
+
+    if best <= original_alpha:
+        bound = UPPER
+    elif best >= beta:
+        bound = LOWER
+    else:
+        bound = EXACT
+    engine.table.store(key, depth, bound, best, best_move)
+    return best, beta
+
+
+def search_move(
+    task: tuple[int, int, int, Stone, tuple[int, int], int, float, int],
+) -> tuple[int | None, bool, int, int]:
+    # the score of one root move, or None if the time ran out or the search
+    # was stopped, and whether it is exact
+    black, white, key, color, (x, y), depth, deadline, generation = task
+    othello = position
+    othello.set_bitboards(Stone.BLACK, black, white)
+    othello.hash = key
+    othello.history.clear()
+    engine.deadline = deadline
+    engine.nodes = 0
+    engine.cutoffs = 0
+    engine.table.generation = generation
+
+    othello.make_move(x, y, color)
+    try:
+        value, beta = search_reply(
+            othello, Stone.flip_color(color), depth - 1, -INFINITY
+        )
+    except SearchTimeout:
+        return None, False, engine.nodes, engine.cutoffs
+    # once another worker's score narrowed the window, a fail low is only an
+    # upper bound: the move is no better than that score, but may be worse
+    score, exact = -value, value < beta
+    if exact:
+        raise_root_alpha(score)
+    return score, exact, engine.nodes, engine.cutoffs
+
+
+class ParallelEngine(Engine):
+    def __init__(
+        self,
+        time_limit_ms: int | None = 1000,
+        max_depth: int = 60,
+        table_size: int = 1 << 18,
+        endgame_empties: int = 12,
+        evaluator: Callable[[Othello, Stone], int] | None = None,
+        workers: int | None = None,
+    ):
+        # the workers keep the tables; the one here only counts generations
+        super().__init__(
+            time_limit_ms,
+            max_depth,
+            TranspositionTable(1),
+            endgame_empties,
+            evaluator,
+        )
+        self.workers = workers if workers is not None else os.cpu_count()
+        # started by the first search that needs it
+        self.pool = None
+        self.root_alpha = None
+        self.stop_flag = RawValue("b", 0)
+        self.table_size = table_size
+
+    def stop(self) -> None:
+        super().stop()
+        self.stop_flag.value = 1
+
+    def search(self, othello: Othello, color: Stone) -> tuple[int, int] | None:
+        self.stop_flag.value = 0
+        return super().search(othello, color)
+
+    def search_root(
+        self, othello: Othello, color: Stone, depth: int, moves: list[tuple[int, int]]
+    ) -> tuple[tuple[int, int], int]:
+        if self.pool is None:
+            self.root_alpha = Value("i", -INFINITY)
+            self.pool = Pool(
+                self.workers,
+                create_engine,
+                (self.root_alpha, self.stop_flag, self.table_size, self.evaluate),
+            )
+        self.root_alpha.value = -INFINITY
+        tasks = [
+            (
+                othello.black,
+                othello.white,
+                othello.hash,
+                color,
+                move,
+                depth,
+                # perf_counter is one clock for all processes, so a task
+                # that waited in the queue does not get a later deadline
+                self.deadline,
+                self.table.generation,
+            )
+            for move in moves
+        ]
+
+        # the eldest brother first and alone, the others once alpha is known
+        results = [self.pool.apply(search_move, (tasks[0],))]
+        if results[0][0] is not None:
+            pending = [
+                self.pool.apply_async(search_move, (task,)) for task in tasks[1:]
+            ]
+            results += [result.get() for result in pending]
+
+        alpha = -INFINITY
+        best_move = moves[0]
+        timed_out = False
+        for move, (score, exact, nodes, cutoffs) in zip(moves, results):
+            self.nodes += nodes
+            self.cutoffs += cutoffs
+            if score is None:
+                timed_out = True
+            elif exact and score > alpha:
+                alpha = score
+                best_move = move
+        if timed_out:
+            raise SearchTimeout
+        return best_move, alpha
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+
+
+class ParallelEnginePlayer(EnginePlayer):
+    def __init__(
+        self,
+        time_limit_ms: int | None = 1000,
+        max_depth: int = 60,
+        table_size: int = 1 << 18,
+        endgame_empties: int = 12,
+        evaluator: Callable[[Othello, Stone], int] | None = None,
+        workers: int | None = None,
+    ):
+        self.engine = ParallelEngine(
+            time_limit_ms, max_depth, table_size, endgame_empties, evaluator, workers
+        )
+
+    def close(self) -> None:
+        self.engine.close()
@@ -0,0 +1,348 @@
+# Pattern-based evaluation
+#
+# usage: python othello_pattern.py train GAMES... -o weights.bin
+#        python othello_pattern.py show weights.bin
+#
+# The evaluation predicts the final disc difference for the player to move.
+# It is a sum of weights looked up by the contents of fixed groups of squares
+# (edges, corners, diagonals, rows), plus a mobility weight and a bias, with
+# one set of weights per game phase. A group of n squares is read as an
+# n-digit base-3 number (0 empty, 1 player, 2 opponent) that indexes its
+# weight table. The 8 board symmetries of a group share one table.
+#
+# Weights file: a 20-byte header (magic, phases, scale, weights per phase)
+# followed by int16 weights, phase by phase: bias, mobility, then the table
+# of every pattern in PATTERNS order. A stored weight is discs * scale.
+#
+# Batched scoring and training need numpy; evaluating a single position
+# does not.
+
+import struct
+from array import array
+from typing import Callable, Iterable
+
+from othello_bitboard import FULL, SQUARE_UNTRANSFORMS, get_symmetries
+from othello_engine import FINAL_SCALE, INFINITY
+from othello_withclass import Othello, Stone
+
+MAGIC = b"OTHPAT01"
+HEADER = struct.Struct("<8sHHI")
+
+PHASES = 4
+SCALE = 256
+PLIES_PER_PHASE = 15
+
+
+def collapse(b):
+    # squares with at most one per column, packed into a byte by column
+    return ((b * 0x0101010101010101) & FULL) >> 56
+
+
+# name, squares in digit order, and a function that packs those squares of
+# a bitboard into the low bits in the same order (bit i is squares[i]); it
+# also works on numpy uint64 arrays
+PATTERNS: list[tuple[str, list[int], Callable]] = [
+    (
+        "edge2x",
+        [0, 1, 2, 3, 4, 5, 6, 7, 9, 14],
+        lambda b: (b & 0xFF) | ((b >> 1) & 0x100) | ((b >> 5) & 0x200),
+    ),
+    (
+        "corner3x3",
+        [0, 1, 2, 8, 9, 10, 16, 17, 18],
+        lambda b: (b & 0x7) | ((b >> 5) & 0x38) | ((b >> 10) & 0x1C0),
+    ),
+    (
+        "corner2x5",
+        [0, 1, 2, 3, 4, 8, 9, 10, 11, 12],
+        lambda b: (b & 0x1F) | ((b >> 3) & 0x3E0),
+    ),
+    ("row2", list(range(8, 16)), lambda b: (b >> 8) & 0xFF),
+    ("row3", list(range(16, 24)), lambda b: (b >> 16) & 0xFF),
+    ("row4", list(range(24, 32)), lambda b: (b >> 24) & 0xFF),
+    ("diagonal8", [0, 9, 18, 27, 36, 45, 54, 63], lambda b: collapse(b & 0x8040201008040201)),
+    ("diagonal7", [8, 17, 26, 35, 44, 53, 62], lambda b: collapse(b & 0x4020100804020100)),
+    ("diagonal6", [16, 25, 34, 43, 52, 61], lambda b: collapse(b & 0x2010080402010000)),
+    ("diagonal5", [24, 33, 42, 51, 60], lambda b: collapse(b & 0x1008040201000000)),
+    ("diagonal4", [32, 41, 50, 59], lambda b: collapse(b & 0x0804020100000000)),
+]  # fmt: skip
+
+
+def get_transforms(squares: list[int]) -> list[int]:
+    # the symmetries that put the pattern on a different set of squares
+    seen, transforms = set(), []
+    for t in range(8):
+        covered = frozenset(SQUARE_UNTRANSFORMS[t][square] for square in squares)
+        if covered not in seen:
+            seen.add(covered)
+            transforms.append(t)
+    return transforms
+
+
+# (pattern index, transform) of every pattern instance on the board
+INSTANCES = [
+    (i, t)
+    for i, (_, squares, _) in enumerate(PATTERNS)
+    for t in get_transforms(squares)
+]
+
+# TERNARY[bits] reads the bits of a packed pattern as base-3 digits of 1
+TERNARY = [sum(3**i for i in range(10) if bits >> i & 1) for bits in range(1 << 10)]
+
+# weights of one phase: bias, mobility, then every pattern table
+TABLE_SIZES = [3 ** len(squares) for _, squares, _ in PATTERNS]
+TABLE_OFFSETS = [2 + sum(TABLE_SIZES[:i]) for i in range(len(PATTERNS))]
+PHASE_SIZE = 2 + sum(TABLE_SIZES)
+
+
+def get_phase(player: int, opponent: int) -> int:
+    plies = (player | opponent).bit_count() - 4
+    return min(plies // PLIES_PER_PHASE, PHASES - 1)
+
+
+def get_codes(player: int, opponent: int) -> list[int]:
+    # the base-3 code of every instance, in INSTANCES order
+    players, opponents = get_symmetries(player), get_symmetries(opponent)
+    return [
+        TERNARY[PATTERNS[i][2](players[t])] + 2 * TERNARY[PATTERNS[i][2](opponents[t])]
+        for i, t in INSTANCES
+    ]
+
+
+class PatternEvaluator:
+    def __init__(self, path: str | None = None):
+        # without a file every weight is zero
+        self.weights = array("h", bytes(2 * PHASES * PHASE_SIZE))
+        self.scale = SCALE
+        if path is not None:
+            self.load(path)
+        self.split()
+
+    def load(self, path: str) -> None:
+        with open(path, "rb") as f:
+            magic, phases, self.scale, size = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or phases != PHASES or size != PHASE_SIZE:
+                raise ValueError(f"{path} is not a weights file for these patterns")
+            self.weights = array("h")
+            self.weights.frombytes(f.read(2 * PHASES * PHASE_SIZE))
+        if len(self.weights) != PHASES * PHASE_SIZE:
+            raise ValueError(f"{path}: truncated weights file")
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, PHASES, self.scale, PHASE_SIZE))
+            f.write(self.weights.tobytes())
+
+    def split(self) -> None:
+        # per phase: bias, mobility and one table per instance
+        self.tables = []
+        for phase in range(PHASES):
+            base = phase * PHASE_SIZE
+            tables = [
+                self.weights[base + TABLE_OFFSETS[i] : base + TABLE_OFFSETS[i] + size]
+                for i, size in enumerate(TABLE_SIZES)
+            ]
+            self.tables.append(
+                (
+                    self.weights[base],
+                    self.weights[base + 1],
+                    [tables[i] for i, _ in INSTANCES],
+                )
+            )
+
+    def score(self, player: int, opponent: int, mobility: int) -> int:
+        # predicted disc difference times self.scale
+        bias, mobility_weight, tables = self.tables[get_phase(player, opponent)]
+        total = bias + mobility_weight * mobility
+        for table, code in zip(tables, get_codes(player, opponent)):
+            total += table[code]
+        return total
+
+    def __call__(self, othello: Othello, color: Stone) -> int:
+        # in engine units, where a won game scores FINAL_SCALE per disc
+        player, opponent = othello.get_bitboards(color)
+        mobility = (
+            othello.get_legal_moves(color).bit_count()
+            - othello.get_legal_moves(Stone.flip_color(color)).bit_count()
+        )
+        score = self.score(player, opponent, mobility) * FINAL_SCALE // self.scale
+        return max(-INFINITY + 1, min(INFINITY - 1, score))
+
+    def evaluate_batch(self, player, opponent):
+        # predicted disc differences (float32) for (N,) uint64 bitboard arrays
+        import numpy as np
+
+        phases, mobility, codes = get_features_batch(player, opponent)
+        weights = np.asarray(self.weights, dtype=np.float32) / self.scale
+        return predict_batch(weights, phases, mobility, codes)
+
+
+def get_features_batch(player, opponent):
+    # phase (N,), mobility difference (N,) and instance codes (N, instances)
+    import numpy as np
+
+    from othello_batch import get_moves, popcount
+
+    player = np.asarray(player, dtype=np.uint64)
+    opponent = np.asarray(opponent, dtype=np.uint64)
+    plies = popcount(player | opponent).astype(np.int32) - 4
+    phases = np.minimum(plies // PLIES_PER_PHASE, PHASES - 1)
+    mobility = popcount(get_moves(player, opponent)).astype(np.int32) - popcount(
+        get_moves(opponent, player)
+    ).astype(np.int32)
+
+    ternary = np.array(TERNARY, dtype=np.int32)
+    players, opponents = get_symmetries_batch(player), get_symmetries_batch(opponent)
+    codes = np.empty((len(player), len(INSTANCES)), dtype=np.int32)
+    for column, (i, t) in enumerate(INSTANCES):
+        extract = PATTERNS[i][2]
+        codes[:, column] = ternary[extract(players[t]).astype(np.intp)] + 2 * (
+            ternary[extract(opponents[t]).astype(np.intp)]
+        )
+    return phases, mobility, codes
+
+
+def get_symmetries_batch(b):
+    # get_symmetries for a numpy uint64 array
+    from othello_bitboard import flip_diagonal, flip_horizontal
+
+    result = []
+    for base in (b, flip_diagonal(b)):
+        mirrored = flip_horizontal(base)
+        result += [base, mirrored, base.byteswap(), mirrored.byteswap()]
+    return result
+
+
+def get_indices_batch(phases, codes):
+    # positions in the flat weight array of every instance's table entry
+    import numpy as np
+
+    offsets = np.array([TABLE_OFFSETS[i] for i, _ in INSTANCES], dtype=np.int64)
+    return (phases[:, None] * PHASE_SIZE + offsets[None, :]) + codes
+
+
+def predict_batch(weights, phases, mobility, codes):
+    import numpy as np
+
+    base = phases.astype(np.int64) * PHASE_SIZE
+    indices = get_indices_batch(phases, codes)
+    return (
+        weights[base]
+        + weights[base + 1] * mobility
+        + weights[indices].sum(axis=1, dtype=np.float32)
+    ).astype(np.float32)
+
+
+def load_positions(paths: Iterable[str]):
+    # (player, opponent, final disc difference for the player) of every
+    # position with a move to play in the record files
+    import numpy as np
+
+    from othello_bitboard import PASS
+    from othello_record import GameRecordReader, replay
+
+    players, opponents, targets = [], [], []
+    for path in paths:
+        for moves, result in GameRecordReader(path):
+            othello = Othello()
+            colors = []
+            for color, square in replay(othello, moves):
+                if square != PASS:
+                    player, opponent = othello.get_bitboards(color)
+                    players.append(player)
+                    opponents.append(opponent)
+                    colors.append(color)
+            if result is None:
+                result = othello.black.bit_count(), othello.white.bit_count()
+            difference = result[0] - result[1]
+            for color in colors:
+                targets.append(difference if color == Stone.BLACK else -difference)
+    return (
+        np.array(players, dtype=np.uint64),
+        np.array(opponents, dtype=np.uint64),
+        np.array(targets, dtype=np.float32),
+    )
+
+
+def train(
+    paths: list[str], epochs: int = 100, regularization: float = 4.0
+) -> PatternEvaluator:
+    # Full-batch gradient steps on the squared error. Each weight moves by
+    # its summed residual divided by how often it occurred (plus the
+    # regularization), shared among the features of a position.
+    import numpy as np
+
+    player, opponent, targets = load_positions(paths)
+    phases, mobility, codes = get_features_batch(player, opponent)
+    indices = get_indices_batch(phases, codes).ravel()
+    base = phases.astype(np.int64) * PHASE_SIZE
+    size = PHASES * PHASE_SIZE
+
+    counts = np.bincount(indices, minlength=size).astype(np.float32)
+    counts[0::PHASE_SIZE] = np.bincount(base // PHASE_SIZE, minlength=PHASES)
+    counts[1::PHASE_SIZE] = np.bincount(
+        base // PHASE_SIZE, weights=mobility.astype(np.float64) ** 2, minlength=PHASES
+    )
+    rate = 1.0 / (len(INSTANCES) + 2)
+
+    weights = np.zeros(size, dtype=np.float32)
+    for epoch in range(epochs):
+        residual = targets - predict_batch(weights, phases, mobility, codes)
+        gradient = np.bincount(
+            indices, weights=np.repeat(residual, len(INSTANCES)), minlength=size
+        )
+        gradient[0::PHASE_SIZE] = np.bincount(
+            base // PHASE_SIZE, weights=residual, minlength=PHASES
+        )
+        gradient[1::PHASE_SIZE] = np.bincount(
+            base // PHASE_SIZE, weights=residual * mobility, minlength=PHASES
+        )
+        weights += (rate * gradient / (counts + regularization)).astype(np.float32)
+        if epoch % 10 == 0 or epoch == epochs - 1:
+            error = np.sqrt(np.mean(residual**2))
+            print(f"epoch {epoch}: rms error {error:.2f} discs")
+
+    evaluator = PatternEvaluator()
+    stored = np.clip(np.round(weights * SCALE), -32768, 32767).astype(np.int16)
+    evaluator.weights = array("h", stored.tobytes())
+    evaluator.split()
+    print(f"{len(targets)} positions from {len(paths)} file(s)")
+    return evaluator
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Othello pattern evaluation")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = subparsers.add_parser("train", help="fit weights to game records")
+    train_parser.add_argument("records", nargs="+", help="othello_record files")
+    train_parser.add_argument("-o", "--output", required=True)
+    train_parser.add_argument("--epochs", type=int, default=100)
+
+    show = subparsers.add_parser("show", help="print weights file statistics")
+    show.add_argument("weights")
+
+    args = parser.parse_args()
+    if args.command == "train":
+        evaluator = train(args.records, args.epochs)
+        evaluator.save(args.output)
+        print(f"{args.output}: {HEADER.size + len(evaluator.weights) * 2} bytes")
+    elif args.command == "show":
+        evaluator = PatternEvaluator(args.weights)
+        print(
+            f"{args.weights}: {len(PATTERNS)} patterns, {len(INSTANCES)} instances, "
+            f"{PHASES} phases, {len(evaluator.weights)} weights"
+        )
+        for phase, (bias, mobility, _) in enumerate(evaluator.tables):
+            print(
+                f"phase {phase}: bias {bias / evaluator.scale:+.2f}, "
+                f"mobility {mobility / evaluator.scale:+.2f} discs per move"
+            )
+        score = evaluator(Othello(), Stone.BLACK) / FINAL_SCALE
+        print(f"initial position: {score:+.2f} discs for black")
+
+
+if __name__ == "__main__":
+    main()
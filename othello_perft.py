@@ -0,0 +1,152 @@
+# Perft: count the leaf nodes of the game tree to a fixed depth
+#
+# usage: python othello_perft.py [--depth D] [--impl easy|withclass|bitboard]
+#
+# Passes and game ends follow play(): a player without a move passes, which
+# uses up one ply, and a position where neither player can move is a leaf.
+
+import argparse
+import sys
+import time
+
+import othello_bitboard
+import othello_easy
+from othello_withclass import Othello, Stone
+
+# published perft counts from the initial position, by depth
+PERFT_COUNTS = [
+    1,
+    4,
+    12,
+    56,
+    244,
+    1396,
+    8200,
+    55092,
+    390216,
+    3005288,
+    24571284,
+    212258800,
+    1939886636,
+    18429641748,
+    184042084512,
+]
+
+
+def perft_easy(board: list[list[str]], color: str, depth: int) -> int:
+    if depth == 0:
+        return 1
+
+    positions = othello_easy.get_flip_positions(board, color)
+    if len(positions) == 0:
+        opponent = othello_easy.flip_color(color)
+        if len(othello_easy.get_flip_positions(board, opponent)) == 0:
+            return 1
+        return perft_easy(board, opponent, depth - 1)
+    if depth == 1:
+        return len(positions)
+
+    nodes = 0
+    for x, y in positions:
+        child = othello_easy.put([row[:] for row in board], x, y, color)
+        nodes += perft_easy(child, othello_easy.flip_color(color), depth - 1)
+    return nodes
+
+
+def perft_withclass(othello: Othello, color: Stone, depth: int) -> int:
+    if depth == 0:
+        return 1
+
+    positions = othello.get_flip_positions(color)
+    if len(positions) == 0:
+        if othello.is_game_over():
+            return 1
+        othello.make_pass()
+        nodes = perft_withclass(othello, Stone.flip_color(color), depth - 1)
+        othello.unmake_move()
+        return nodes
+    if depth == 1:
+        return len(positions)
+
+    nodes = 0
+    for x, y in positions:
+        othello.make_move(x, y, color)
+        nodes += perft_withclass(othello, Stone.flip_color(color), depth - 1)
+        othello.unmake_move()
+    return nodes
+
+
+def perft_bitboard(player: int, opponent: int, depth: int) -> int:
+    if depth == 0:
+        return 1
+
+    moves = othello_bitboard.get_moves(player, opponent)
+    if moves == 0:
+        if othello_bitboard.get_moves(opponent, player) == 0:
+            return 1
+        return perft_bitboard(opponent, player, depth - 1)
+    if depth == 1:
+        return moves.bit_count()
+
+    nodes = 0
+    for square in othello_bitboard.to_squares(moves):
+        flips = othello_bitboard.get_flips(player, opponent, square)
+        nodes += perft_bitboard(
+            opponent & ~flips, player | flips | (1 << square), depth - 1
+        )
+    return nodes
+
+
+IMPLEMENTATIONS = {
+    "easy": lambda depth: perft_easy(
+        othello_easy.create_board(), othello_easy.BLACK_CHAR, depth
+    ),
+    "withclass": lambda depth: perft_withclass(Othello(), Stone.BLACK, depth),
+    "bitboard": lambda depth: perft_bitboard(
+        othello_bitboard.INITIAL_BLACK, othello_bitboard.INITIAL_WHITE, depth
+    ),
+}
+
+
+def run(name: str, depth: int) -> bool:
+    start = time.perf_counter()
+    nodes = IMPLEMENTATIONS[name](depth)
+    elapsed = time.perf_counter() - start
+
+    expected = PERFT_COUNTS[depth] if depth < len(PERFT_COUNTS) else None
+    status = "ok" if nodes == expected else f"MISMATCH (expected {expected})"
+    if expected is None:
+        status = "unknown"
+    print(
+        f"{name:>10} depth {depth}: {nodes} nodes, {elapsed:.3f} s, "
+        f"{nodes / max(elapsed, 1e-9):,.0f} nodes/s  {status}"
+    )
+    return expected is None or nodes == expected
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Othello perft")
+    parser.add_argument("--depth", type=int, default=6)
+    parser.add_argument(
+        "--impl",
+        choices=list(IMPLEMENTATIONS) + ["all"],
+        default="all",
+        help="rule implementation to test",
+    )
+    parser.add_argument(
+        "--all-depths", action="store_true", help="run every depth from 1 to --depth"
+    )
+    args = parser.parse_args()
+
+    names = list(IMPLEMENTATIONS) if args.impl == "all" else [args.impl]
+    depths = range(1, args.depth + 1) if args.all_depths else [args.depth]
+
+    ok = True
+    for depth in depths:
+        for name in names:
+            ok = run(name, depth) and ok
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
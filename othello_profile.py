@@ -0,0 +1,316 @@
+# Instrumentation and profiling for a game
+#
+# usage: python othello_profile.py [--black engine] [--white greedy]
+#                                  [--profiler cprofile|sample] -o profile.json
+#
+# A Profiler replaces the methods it measures with timing wrappers on one
+# Othello object (or on a module, for the function-based versions) and puts
+# the originals back when it is done. Nothing is wrapped unless a profiler is
+# attached, so an unprofiled game runs exactly the same code as before.
+#
+# The JSON summary holds call counts and cumulative seconds per function
+# (time spent in nested calls is included), search counters per engine, and
+# one entry per move with what that move cost.
+
+import argparse
+import contextlib
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from types import ModuleType
+from typing import Any, Callable
+
+from othello_engine import Engine
+from othello_withclass import Othello, Player, Stone
+
+METHODS = (
+    "get_flip_direction",
+    "get_flip_positions",
+    "get_legal_moves",
+    "has_legal_move",
+    "put",
+    "make_move",
+    "unmake_move",
+    "print_board",
+    "draw_board",
+    "draw_squares",
+)
+
+# functions of othello_easy / othello_easy_with_color
+FUNCTIONS = (
+    "get_flip_direction",
+    "get_flip_positions",
+    "has_legal_move",
+    "put",
+    "print_board",
+)
+
+MISSING = object()
+
+
+class Profiler:
+    def __init__(self):
+        self.calls: Counter[str] = Counter()
+        self.seconds: Counter[str] = Counter()
+        self.engines: dict[str, Engine] = {}
+        self.search: dict[str, Counter[str]] = {}
+        self.moves: list[dict[str, Any]] = []
+        # (owner, name, attribute the owner had itself or MISSING)
+        self.patched: list[tuple[object, str, object]] = []
+        self.start = time.perf_counter()
+        self.last_move = (self.start, Counter(), Counter())
+
+    def wrap(self, owner: object, name: str, label: str) -> None:
+        function = getattr(owner, name)
+        calls, seconds = self.calls, self.seconds
+        perf_counter = time.perf_counter
+
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                calls[label] += 1
+                seconds[label] += perf_counter() - start
+
+        self.patch(owner, name, timed)
+
+    def instrument(self, othello: Othello) -> None:
+        for name in METHODS:
+            if hasattr(othello, name):
+                self.wrap(othello, name, name)
+
+        # one summary entry each time a move lands on the board
+        put = othello.put
+
+        def put_and_record(x: int, y: int, color: Stone):
+            size = len(othello.history)
+            put(x, y, color)
+            if len(othello.history) > size:
+                self.record_move((x, y), color)
+
+        self.patch(othello, "put", put_and_record)
+
+    def instrument_module(self, module: ModuleType) -> None:
+        for name in FUNCTIONS:
+            if hasattr(module, name):
+                self.wrap(module, name, f"{module.__name__}.{name}")
+
+    def instrument_engine(self, engine: Engine, label: str) -> None:
+        self.engines[label] = engine
+        counters = self.search[label] = Counter()
+        search = engine.search
+        perf_counter = time.perf_counter
+
+        def timed_search(othello: Othello, color: Stone):
+            hits = engine.table.hits
+            start = perf_counter()
+            try:
+                return search(othello, color)
+            finally:
+                counters["searches"] += 1
+                counters["seconds"] += perf_counter() - start
+                counters["nodes"] += engine.nodes
+                counters["cutoffs"] += engine.cutoffs
+                counters["table_hits"] += engine.table.hits - hits
+                counters["depth"] += engine.depth
+
+        self.patch(engine, "search", timed_search)
+
+    def instrument_players(self, players: dict[str, Player | None]) -> None:
+        for label, player in players.items():
+            engine = getattr(player, "engine", None)
+            if engine is not None:
+                self.instrument_engine(engine, label)
+
+    def patch(self, owner: object, name: str, value: object) -> None:
+        self.patched.append((owner, name, vars(owner).get(name, MISSING)))
+        setattr(owner, name, value)
+
+    def restore(self) -> None:
+        for owner, name, previous in reversed(self.patched):
+            if previous is MISSING:
+                delattr(owner, name)
+            else:
+                setattr(owner, name, previous)
+        self.patched = []
+
+    def totals(self) -> Counter[str]:
+        totals = Counter()
+        for counters in self.search.values():
+            totals.update(counters)
+        return totals
+
+    def record_move(self, move: tuple[int, int], color: Stone) -> None:
+        now = time.perf_counter()
+        last_time, last_calls, last_search = self.last_move
+        calls, search = self.calls.copy(), self.totals()
+        self.moves.append(
+            {
+                "ply": len(self.moves) + 1,
+                "color": color.name.lower(),
+                "move": list(move),
+                "seconds": now - last_time,
+                "calls": dict(calls - last_calls),
+                "search": dict(search - last_search),
+            }
+        )
+        self.last_move = (now, calls, search)
+
+    def summary(self) -> dict[str, Any]:
+        search = {}
+        for label, counters in self.search.items():
+            searches = max(counters["searches"], 1)
+            search[label] = dict(counters)
+            search[label]["average_depth"] = counters["depth"] / searches
+            search[label]["nodes_per_second"] = counters["nodes"] / max(
+                counters["seconds"], 1e-9
+            )
+            search[label]["table"] = self.engines[label].table.stats()
+        return {
+            "seconds": time.perf_counter() - self.start,
+            "functions": {
+                name: {"calls": self.calls[name], "seconds": self.seconds[name]}
+                for name in sorted(self.seconds, key=self.seconds.get, reverse=True)
+            },
+            "search": search,
+            "moves": self.moves,
+        }
+
+    def write(self, path: str, extra: dict[str, Any] | None = None) -> None:
+        summary = self.summary()
+        if extra:
+            summary.update(extra)
+        with open(path, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+class Sampler:
+    # a statistical profiler: a background thread looks at the stack of the
+    # profiled thread every `interval` seconds
+    def __init__(self, interval: float = 0.001):
+        self.interval = interval
+        self.samples = 0
+        self.leaf: Counter[str] = Counter()
+        self.inclusive: Counter[str] = Counter()
+        self.running = False
+        self.thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        self.running = True
+        self.thread = threading.Thread(
+            target=self.sample, args=(threading.get_ident(),), daemon=True
+        )
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.running = False
+        self.thread.join()
+
+    def sample(self, ident: int) -> None:
+        while self.running:
+            time.sleep(self.interval)
+            frame = sys._current_frames().get(ident)
+            if frame is None:
+                continue
+            self.samples += 1
+            self.leaf[describe(frame)] += 1
+            seen = set()
+            while frame is not None:
+                name = describe(frame)
+                if name not in seen:
+                    seen.add(name)
+                    self.inclusive[name] += 1
+                frame = frame.f_back
+
+    def summary(self, top: int = 20) -> dict[str, Any]:
+        samples = max(self.samples, 1)
+        return {
+            "samples": self.samples,
+            "interval": self.interval,
+            "self": {name: n / samples for name, n in self.leaf.most_common(top)},
+            "total": {name: n / samples for name, n in self.inclusive.most_common(top)},
+        }
+
+
+def describe(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def profile_game(
+    othello: Othello,
+    play: Callable[..., None],
+    options: dict[str, Any],
+    path: str,
+    profiler: str | None = None,
+) -> None:
+    # plays one game with the options of parse_options and writes the JSON
+    # summary to path; cProfile statistics go to path + ".prof"
+    instrumentation = Profiler()
+    instrumentation.instrument(othello)
+    instrumentation.instrument_players(
+        {"black": options.get("black"), "white": options.get("white")}
+    )
+    sampler = Sampler() if profiler == "sample" else None
+    python_profile = cProfile.Profile() if profiler == "cprofile" else None
+
+    try:
+        if sampler is not None:
+            sampler.start()
+        if python_profile is not None:
+            python_profile.enable()
+        play(**options)
+    finally:
+        if python_profile is not None:
+            python_profile.disable()
+            python_profile.dump_stats(path + ".prof")
+        extra = {}
+        if sampler is not None:
+            sampler.stop()
+            extra["samples"] = sampler.summary()
+        instrumentation.restore()
+        instrumentation.write(path, extra)
+
+
+def main() -> None:
+    from othello_engine import EnginePlayer, GreedyPlayer, RandomPlayer
+
+    kinds = {
+        "engine": lambda: EnginePlayer(args.time_limit),
+        "greedy": lambda: GreedyPlayer(args.seed),
+        "random": lambda: RandomPlayer(args.seed),
+    }
+    parser = argparse.ArgumentParser(description="Profile one computer game")
+    parser.add_argument("--black", choices=list(kinds), default="engine")
+    parser.add_argument("--white", choices=list(kinds), default="greedy")
+    parser.add_argument("--time-limit", type=int, default=100, help="ms per move")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--profiler", choices=["cprofile", "sample"])
+    parser.add_argument("-o", "--output", default="profile.json")
+    args = parser.parse_args()
+
+    othello = Othello()
+    options = {"black": kinds[args.black](), "white": kinds[args.white]()}
+    # the board printing is part of the profile, but not of the terminal
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        profile_game(othello, othello.play, options, args.output, args.profiler)
+
+    with open(args.output) as f:
+        summary = json.load(f)
+    print(f"{args.output}: {len(summary['moves'])} moves, {summary['seconds']:.2f} s")
+    for name, function in list(summary["functions"].items())[:8]:
+        print(f"{name:>20}: {function['calls']:8} calls {function['seconds']:8.3f} s")
+    for label, search in summary["search"].items():
+        print(
+            f"{label:>20}: {search['nodes']} nodes, {search['cutoffs']} cutoffs, "
+            f"{search['table_hits']} table hits"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# Compact binary game records
+#
+# usage: python othello_record.py FILE  (prints a summary of a record file)
+#
+# File layout: the 5-byte magic b"OTHR\x01", then one record per game:
+#   flags      1 byte   bit 0 set when a result trailer follows
+#   length     1 byte   number of moves
+#   moves      1 byte each, the square index (y * 8 + x) or 64 for a pass
+#   result     2 bytes  black discs, white discs (only with the flag)
+#
+# Files ending in .gz are gzip streams and files ending in .zst are zstd
+# frames (needs the zstandard package). Records are read and written one at
+# a time, so a file with millions of games never has to fit in memory.
+
+import gzip
+from typing import BinaryIO, Iterator
+
+from othello_bitboard import PASS, to_xy
+from othello_withclass import Othello, Stone
+
+MAGIC = b"OTHR\x01"
+HAS_RESULT = 0x01
+
+
+def open_stream(path: str, mode: str) -> BinaryIO:
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "b")
+    if path.endswith(".zst"):
+        import zstandard
+
+        f = open(path, mode + "b")
+        if mode == "w":
+            return zstandard.ZstdCompressor().stream_writer(f, closefd=True)
+        return zstandard.ZstdDecompressor().stream_reader(f, closefd=True)
+    return open(path, mode + "b")
+
+
+class GameRecordWriter:
+    def __init__(self, path: str):
+        self.stream = open_stream(path, "w")
+        self.stream.write(MAGIC)
+        self.count = 0
+
+    def write(self, moves: list[int], result: tuple[int, int] | None = None) -> None:
+        if len(moves) > 255:
+            raise ValueError("a game record holds at most 255 moves")
+        flags = HAS_RESULT if result is not None else 0
+        data = bytes([flags, len(moves)]) + bytes(moves)
+        if result is not None:
+            data += bytes(result)
+        self.stream.write(data)
+        self.count += 1
+
+    def close(self) -> None:
+        self.stream.close()
+
+    def __enter__(self) -> "GameRecordWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class GameRecordReader:
+    def __init__(self, path: str):
+        self.path = path
+
+    def __iter__(self) -> Iterator[tuple[bytes, tuple[int, int] | None]]:
+        with open_stream(self.path, "r") as stream:
+            if read_exact(stream, len(MAGIC)) != MAGIC:
+                raise ValueError(f"{self.path} is not a game record file")
+            while True:
+                header = stream.read(2)
+                if len(header) == 0:
+                    return
+                if len(header) == 1:
+                    header += read_exact(stream, 1)
+                flags, length = header
+                moves = read_exact(stream, length)
+                result = None
+                if flags & HAS_RESULT:
+                    result = tuple(read_exact(stream, 2))
+                yield moves, result
+
+    def games(self) -> Iterator[Othello]:
+        # the final position of every game, replayed one game at a time
+        for moves, _ in self:
+            othello = Othello()
+            for _ in replay(othello, moves):
+                pass
+            yield othello
+
+
+def read_exact(stream: BinaryIO, size: int) -> bytes:
+    data = b""
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if len(chunk) == 0:
+            raise ValueError("truncated game record")
+        data += chunk
+    return data
+
+
+def replay(othello: Othello, moves: bytes) -> Iterator[tuple[Stone, int]]:
+    # plays the moves on the board, yielding (color, square) before each one
+    color = Stone.BLACK
+    for square in moves:
+        yield color, square
+        if square == PASS:
+            othello.make_pass()
+        elif not othello.make_move(*to_xy(square), color):
+            raise ValueError(f"illegal move {to_xy(square)} for {color.name.lower()}")
+        color = Stone.flip_color(color)
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Othello game record summary")
+    parser.add_argument("file")
+    args = parser.parse_args()
+
+    games = moves = black_wins = white_wins = draws = 0
+    for othello in GameRecordReader(args.file).games():
+        games += 1
+        moves += len(othello.history)
+        black, white = othello.black.bit_count(), othello.white.bit_count()
+        black_wins += black > white
+        white_wins += white > black
+        draws += black == white
+    print(f"{args.file}: {games} games, {moves} moves")
+    print(f"black wins {black_wins}, white wins {white_wins}, draws {draws}")
+
+
+if __name__ == "__main__":
+    main()
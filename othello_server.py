@@ -0,0 +1,426 @@
+# Multi-game server
+#
+# usage: python othello_server.py serve [--host H] [--port P | --unix PATH]
+#        python othello_server.py load [--port P | --unix PATH] [--games N]
+#
+# Every game is an Othello object held in one process; any connection can
+# play any game by its id. The protocol is one JSON object per line in each
+# direction, answered in order:
+#
+#   {"op": "new"}                                  a game, black to move
+#   {"op": "moves", "game": ID}                    legal moves of the side to move
+#   {"op": "move", "game": ID, "x": X, "y": Y}     play for the side to move
+#   {"op": "board", "game": ID}                    the current state
+#   {"op": "resign", "game": ID}                   the side to move resigns
+#
+# Answers carry "ok": true and the state of the game (board rows of "B", "W"
+# and ".", disc counts, "turn" and the legal moves, or "winner" once it is
+# over), or "ok": false and an "error". An "id" in a request is echoed back.
+# A side without a legal move passes automatically.
+#
+# Each connection handles one request at a time and waits for its answers to
+# be sent before reading the next, so a client that does not read its answers
+# stops being read from. Games that nobody touched for --idle-timeout seconds
+# are dropped.
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import OrderedDict
+
+from othello_bitboard import to_square
+from othello_withclass import Othello, Stone
+
+MAX_LINE = 4096
+
+# board row strings by (black byte, white byte), filled in as rows show up
+ROWS: dict[tuple[int, int], str] = {}
+
+
+def row_string(black: int, white: int) -> str:
+    row = ROWS.get((black, white))
+    if row is None:
+        row = ROWS[black, white] = "".join(
+            "B" if black >> x & 1 else "W" if white >> x & 1 else "." for x in range(8)
+        )
+    return row
+
+
+class Game:
+    __slots__ = ("othello", "color", "winner", "last_used")
+
+    def __init__(self):
+        self.othello = Othello()
+        # None once the game is over
+        self.color: Stone | None = Stone.BLACK
+        # "black", "white", "draw" or None
+        self.winner: str | None = None
+        self.last_used = time.monotonic()
+
+    def state(self) -> dict:
+        othello = self.othello
+        black, white = othello.black, othello.white
+        state = {
+            "board": [
+                row_string(black >> shift & 0xFF, white >> shift & 0xFF)
+                for shift in range(0, 64, 8)
+            ],
+            "black": othello.black.bit_count(),
+            "white": othello.white.bit_count(),
+        }
+        if self.color is None:
+            state["winner"] = self.winner
+        else:
+            state["turn"] = self.color.name.lower()
+            state["moves"] = othello.get_flip_positions(self.color)
+        return state
+
+    def move(self, x: int, y: int) -> None:
+        othello, color = self.othello, self.color
+        if not (othello.get_legal_moves(color) >> to_square(x, y)) & 1:
+            raise ValueError(f"illegal move: ({x}, {y})")
+        othello.make_move(x, y, color)
+
+        opponent = Stone.flip_color(color)
+        # the full mask is cached for state(), which lists the moves
+        if othello.get_legal_moves(opponent):
+            self.color = opponent
+        elif othello.has_legal_move(color):
+            othello.make_pass()
+        else:
+            black, white = othello.black.bit_count(), othello.white.bit_count()
+            self.winner = (
+                "black" if black > white else "white" if white > black else "draw"
+            )
+            self.color = None
+
+    def resign(self) -> None:
+        self.winner = Stone.flip_color(self.color).name.lower()
+        self.color = None
+
+
+class GameServer:
+    def __init__(self, idle_timeout: float = 300.0, max_games: int = 1_000_000):
+        self.idle_timeout = idle_timeout
+        self.max_games = max_games
+        # least recently used first, so eviction only looks at the front
+        self.games: OrderedDict[int, Game] = OrderedDict()
+        self.next_id = 1
+        self.connections = 0
+        self.requests = 0
+        self.evicted = 0
+
+    def get_game(self, request: dict) -> Game:
+        game_id = request.get("game")
+        # a list or dict would not even be hashable
+        game = self.games.get(game_id) if type(game_id) is int else None
+        if game is None:
+            raise ValueError(f"unknown game: {game_id}")
+        game.last_used = time.monotonic()
+        self.games.move_to_end(game_id)
+        return game
+
+    def handle(self, request: dict) -> dict:
+        op = request.get("op")
+        if op == "new":
+            if len(self.games) >= self.max_games:
+                raise ValueError("too many games")
+            game_id = self.next_id
+            self.next_id += 1
+            game = self.games[game_id] = Game()
+            return {"game": game_id, **game.state()}
+
+        game = self.get_game(request)
+        if op == "board":
+            return game.state()
+        if op == "moves":
+            return {"moves": [] if game.color is None else game.state()["moves"]}
+        if op in ("move", "resign") and game.color is None:
+            raise ValueError("game is over")
+        if op == "move":
+            x, y = request.get("x"), request.get("y")
+            if (
+                type(x) is not int
+                or type(y) is not int
+                or not (0 <= x < 8 and 0 <= y < 8)
+            ):
+                raise ValueError("x and y must be integers from 0 to 7")
+            game.move(x, y)
+            return game.state()
+        if op == "resign":
+            game.resign()
+            return game.state()
+        raise ValueError(f"unknown op: {op}")
+
+    def answer(self, line: bytes) -> bytes:
+        self.requests += 1
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("a request must be a JSON object")
+            request_id = request.get("id")
+            response = {"ok": True, **self.handle(request)}
+        except ValueError as e:
+            # json.JSONDecodeError is a ValueError too
+            response = {"ok": False, "error": str(e)}
+        except (TypeError, KeyError) as e:
+            # a request of an unexpected shape must not end the connection
+            response = {"ok": False, "error": f"bad request: {e!r}"}
+        except RecursionError:
+            # nested deeper than json can parse, yet shorter than MAX_LINE
+            response = {"ok": False, "error": "request nested too deeply"}
+        if request_id is not None:
+            response["id"] = request_id
+        return json.dumps(response, separators=(",", ":")).encode() + b"\n"
+
+    async def serve_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # longer than MAX_LINE; the stream cannot be resynchronized
+                    writer.write(b'{"ok":false,"error":"request too long"}\n')
+                    break
+                if not line:
+                    break
+                if line.strip():
+                    writer.write(self.answer(line))
+                    # blocks only while the client lets answers pile up
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    def evict(self) -> int:
+        deadline = time.monotonic() - self.idle_timeout
+        count = 0
+        while self.games:
+            game_id, game = next(iter(self.games.items()))
+            if game.last_used > deadline:
+                break
+            del self.games[game_id]
+            count += 1
+        self.evicted += count
+        return count
+
+    async def evict_forever(self) -> None:
+        while True:
+            await asyncio.sleep(max(self.idle_timeout / 4, 0.1))
+            self.evict()
+
+    async def report_forever(self, interval: float) -> None:
+        requests = self.requests
+        while True:
+            await asyncio.sleep(interval)
+            rate = (self.requests - requests) / interval
+            requests = self.requests
+            print(
+                f"{len(self.games)} games, {self.connections} connections, "
+                f"{rate:.0f} requests/s, {self.evicted} evicted",
+                flush=True,
+            )
+
+
+async def serve(args: argparse.Namespace) -> None:
+    server = GameServer(args.idle_timeout, args.max_games)
+    if args.unix:
+        listener = await asyncio.start_unix_server(
+            server.serve_connection, args.unix, limit=MAX_LINE
+        )
+    else:
+        listener = await asyncio.start_server(
+            server.serve_connection, args.host, args.port, limit=MAX_LINE, backlog=1024
+        )
+    print(f"listening on {args.unix or f'{args.host}:{args.port}'}", flush=True)
+    tasks = [asyncio.create_task(server.evict_forever())]
+    if args.report:
+        tasks.append(asyncio.create_task(server.report_forever(args.report)))
+    async with listener:
+        await listener.serve_forever()
+
+
+async def open_connection(args: argparse.Namespace):
+    if args.unix:
+        return await asyncio.open_unix_connection(args.unix, limit=1 << 20)
+    return await asyncio.open_connection(args.host, args.port, limit=1 << 20)
+
+
+class LoadClient:
+    # one connection keeping `games` games going: each round sends a request
+    # for up to `pipeline` of them before reading the answers, and a finished
+    # game is replaced by a new one
+    def __init__(self, args: argparse.Namespace, games: int, seed: int):
+        self.args = args
+        self.games = games
+        self.random = random.Random(seed)
+        self.states: list[dict] = []
+        self.latencies: list[float] = []
+        self.counts = {"requests": 0, "moves": 0, "finished": 0, "errors": 0}
+
+    async def exchange(self, requests: list[dict], sent: float) -> list[dict]:
+        self.writer.write(b"".join(json.dumps(r).encode() + b"\n" for r in requests))
+        await self.writer.drain()
+        responses = []
+        for _ in requests:
+            responses.append(json.loads(await self.reader.readline()))
+            self.latencies.append(time.perf_counter() - sent)
+        self.counts["requests"] += len(requests)
+        return responses
+
+    async def start(self) -> None:
+        self.reader, self.writer = await open_connection(self.args)
+        self.states = await self.exchange(
+            [{"op": "new"}] * self.games, time.perf_counter()
+        )
+        # creating the games is not part of the measurement
+        self.latencies.clear()
+        self.counts["requests"] = 0
+
+    def next_request(self, state: dict) -> dict:
+        if "winner" in state:
+            return {"op": "new"}
+        if self.random.random() < self.args.resign_rate:
+            return {"op": "resign", "game": state["game"]}
+        x, y = self.random.choice(state["moves"])
+        return {"op": "move", "game": state["game"], "x": x, "y": y}
+
+    async def run(self, deadline: float, interval: float) -> None:
+        # with an interval, rounds start on a fixed schedule and latency is
+        # measured from the scheduled time, so a slow server cannot hide its
+        # delays by slowing the client down
+        next_game = 0
+        scheduled = time.perf_counter() + self.random.random() * interval
+        while scheduled < deadline:
+            if interval:
+                await asyncio.sleep(scheduled - time.perf_counter())
+                sent = scheduled
+                scheduled += interval
+            else:
+                sent = scheduled = time.perf_counter()
+            size = min(self.args.pipeline, self.games)
+            batch = [(next_game + i) % self.games for i in range(size)]
+            next_game = (next_game + size) % self.games
+            requests = [self.next_request(self.states[i]) for i in batch]
+            responses = await self.exchange(requests, sent)
+            for i, request, response in zip(batch, requests, responses):
+                if not response["ok"]:
+                    self.counts["errors"] += 1
+                    response = (await self.exchange([{"op": "new"}], sent))[0]
+                elif request["op"] != "new":
+                    response["game"] = request["game"]
+                    self.counts["moves"] += request["op"] == "move"
+                    self.counts["finished"] += "winner" in response
+                self.states[i] = response
+
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+def percentile(values: list[float], p: float) -> float:
+    # values must be sorted; nan when there are none
+    if not values:
+        return float("nan")
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def load(args: argparse.Namespace) -> None:
+    clients = [
+        LoadClient(args, games, args.seed + i)
+        for i in range(args.connections)
+        if (
+            games := args.games // args.connections
+            + (i < args.games % args.connections)
+        )
+    ]
+    await asyncio.gather(*(client.start() for client in clients))
+
+    # each round of a client sends `pipeline` requests
+    interval = len(clients) * args.pipeline / args.rate if args.rate else 0
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(client.run(start + args.seconds, interval) for client in clients)
+    )
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(t for client in clients for t in client.latencies)
+    counts = {
+        name: sum(client.counts[name] for client in clients)
+        for name in clients[0].counts
+    }
+    print(
+        f"{args.games} games on {len(clients)} connections, "
+        f"pipeline {args.pipeline}, "
+        f"{f'{args.rate:g} requests/s offered' if args.rate else 'closed loop'}, "
+        f"{elapsed:.1f} s"
+    )
+    print(
+        f"  {counts['requests']} requests ({counts['requests'] / elapsed:.0f}/s), "
+        f"{counts['moves']} moves ({counts['moves'] / elapsed:.0f}/s), "
+        f"{counts['finished']} games finished, {counts['errors']} errors"
+    )
+    print(
+        "  latency ms: "
+        + ", ".join(
+            f"p{p:g} {percentile(latencies, p) * 1000:.2f}" for p in (50, 90, 99, 99.9)
+        )
+        + f", max {percentile(latencies, 100) * 1000:.2f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Othello multi-game server")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, help in (("serve", "run the server"), ("load", "generate load")):
+        subparser = subparsers.add_parser(name, help=help)
+        subparser.add_argument("--host", default="127.0.0.1")
+        subparser.add_argument("--port", type=int, default=8765)
+        subparser.add_argument("--unix", help="Unix socket path instead of TCP")
+
+    serve_parser = subparsers.choices["serve"]
+    serve_parser.add_argument(
+        "--idle-timeout", type=float, default=300, help="seconds before eviction"
+    )
+    serve_parser.add_argument("--max-games", type=int, default=1_000_000)
+    serve_parser.add_argument(
+        "--report", type=float, default=0, help="print statistics every N seconds"
+    )
+
+    load_parser = subparsers.choices["load"]
+    load_parser.add_argument("--games", type=int, default=10000)
+    load_parser.add_argument("--connections", type=int, default=100)
+    load_parser.add_argument(
+        "--pipeline", type=int, default=1, help="requests in flight per connection"
+    )
+    load_parser.add_argument("--seconds", type=float, default=10)
+    load_parser.add_argument(
+        "--rate", type=float, default=0, help="requests/s to offer (default: max)"
+    )
+    load_parser.add_argument("--resign-rate", type=float, default=0.001)
+    load_parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+    if args.command == "load":
+        for name in ("games", "connections", "pipeline"):
+            if getattr(args, name) < 1:
+                parser.error(f"--{name} must be at least 1")
+    try:
+        asyncio.run(serve(args) if args.command == "serve" else load(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
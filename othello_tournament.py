@@ -0,0 +1,206 @@
+# Headless self-play tournament
+#
+# usage: python othello_tournament.py PLAYER_A PLAYER_B [--games M] [--workers N]
+# players: random, greedy, search:DEPTH, pattern:DEPTH (search with --weights),
+#          mcts:PLAYOUTS
+#
+# One JSON line per game is written as soon as the game finishes, and the
+# summary goes to stderr at the end.
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+from othello_bitboard import PASS, to_square
+from othello_book import OpeningBook
+from othello_engine import EnginePlayer, GreedyPlayer, RandomPlayer
+from othello_mcts import MCTSPlayer
+from othello_pattern import PatternEvaluator
+from othello_record import GameRecordWriter
+from othello_withclass import Othello, Player, Stone
+
+
+def create_player(spec: str, seed: int) -> Player:
+    name, _, depth = spec.partition(":")
+    if name == "random":
+        return RandomPlayer(seed)
+    if name == "greedy":
+        return GreedyPlayer(seed)
+    if name == "search" or (name == "pattern" and evaluator is not None):
+        depth = int(depth or 4)
+        return EnginePlayer(
+            None,
+            depth,
+            table_size=1 << 16,
+            endgame_empties=depth,
+            evaluator=evaluator if name == "pattern" else None,
+        )
+    if name == "mcts":
+        # a playout budget rather than time, so results do not depend on load
+        return MCTSPlayer(None, int(depth or 1000), max_nodes=1 << 16, seed=seed)
+    raise ValueError(f"unknown player: {spec}")
+
+
+def play_game(
+    black: Player, white: Player, book: OpeningBook | None = None
+) -> tuple[list[int], int, int]:
+    othello = Othello()
+    players = {Stone.BLACK: black, Stone.WHITE: white}
+
+    moves = []
+    current_color = Stone.BLACK
+    while not othello.is_game_over():
+        if not othello.has_legal_move(current_color):
+            othello.make_pass()
+            moves.append(PASS)
+        else:
+            player = players[current_color]
+            move = None
+            if book is not None and isinstance(player, EnginePlayer):
+                move = book.lookup(othello, current_color)
+            if move is None:
+                move = player.get_move(othello, current_color)
+            x, y = move
+            othello.make_move(x, y, current_color)
+            moves.append(to_square(x, y))
+        current_color = Stone.flip_color(current_color)
+    return moves, othello.black.bit_count(), othello.white.bit_count()
+
+
+# opened once per worker process; the mmap pages are shared between workers
+book: OpeningBook | None = None
+evaluator: PatternEvaluator | None = None
+
+
+def open_files(book_path: str | None, weights_path: str | None) -> None:
+    global book, evaluator
+    book = OpeningBook(book_path) if book_path else None
+    evaluator = PatternEvaluator(weights_path) if weights_path else None
+
+
+def run_game(task: tuple[int, str, str, int]) -> dict:
+    # player A plays black in even games and white in odd games
+    game, player_a, player_b, seed = task
+    a_is_black = game % 2 == 0
+    black_spec, white_spec = (
+        (player_a, player_b) if a_is_black else (player_b, player_a)
+    )
+
+    start = time.perf_counter()
+    players = [create_player(black_spec, seed), create_player(white_spec, seed + 1)]
+    try:
+        moves, black, white = play_game(*players, book)
+    finally:
+        for player in players:
+            player.close()
+    a_discs, b_discs = (black, white) if a_is_black else (white, black)
+    return {
+        "game": game,
+        "black": black_spec,
+        "white": white_spec,
+        "black_discs": black,
+        "white_discs": white,
+        "result": (
+            "win" if a_discs > b_discs else "loss" if a_discs < b_discs else "draw"
+        ),
+        "moves": moves,
+        "seconds": round(time.perf_counter() - start, 4),
+    }
+
+
+def wilson_interval(successes: float, n: int, z: float = 1.96) -> tuple[float, float]:
+    if n == 0:
+        return 0.0, 1.0
+    p = successes / n
+    center = (p + z * z / (2 * n)) / (1 + z * z / n)
+    margin = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def summarize(
+    player_a: str, player_b: str, counts: dict[str, int], elapsed: float
+) -> str:
+    n = sum(counts.values())
+    lines = [
+        f"{player_a} vs {player_b}: {n} games in {elapsed:.1f} s "
+        f"({n / elapsed:.2f} games/s)"
+    ]
+    for result in ("win", "draw", "loss"):
+        low, high = wilson_interval(counts[result], n)
+        rate = counts[result] / n if n else 0.0
+        lines.append(
+            f"  {result:>4}: {counts[result]:>6} "
+            f"{rate:6.1%} (95% CI {low:6.1%} - {high:6.1%})"
+        )
+    # wins count 1 and draws 1/2 for player A
+    low, high = wilson_interval(counts["win"] + counts["draw"] / 2, n)
+    score = (counts["win"] + counts["draw"] / 2) / n if n else 0.0
+    lines.append(f"  score: {score:6.1%} (95% CI {low:6.1%} - {high:6.1%})")
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Othello self-play tournament")
+    parser.add_argument(
+        "player_a", help="random, greedy, search:DEPTH, pattern:DEPTH or mcts:N"
+    )
+    parser.add_argument(
+        "player_b", help="random, greedy, search:DEPTH, pattern:DEPTH or mcts:N"
+    )
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON lines file (default: stdout)")
+    parser.add_argument("--book", help="opening book consulted before every move")
+    parser.add_argument("--record", help="also write games to a record file")
+    parser.add_argument("--weights", help="pattern evaluation weights (pattern:D)")
+    args = parser.parse_args()
+
+    # fail early on a bad player spec or file instead of inside a worker
+    for spec in (args.player_a, args.player_b):
+        if spec.partition(":")[0] == "pattern" and not args.weights:
+            parser.error(f"{spec} needs --weights")
+    open_files(args.book, args.weights)
+    for spec in (args.player_a, args.player_b):
+        try:
+            create_player(spec, 0)
+        except ValueError as e:
+            parser.error(str(e))
+
+    tasks = (
+        (game, args.player_a, args.player_b, args.seed + 2 * game)
+        for game in range(args.games)
+    )
+    # small chunks keep results streaming, larger ones cut IPC for fast players
+    chunksize = max(1, min(32, args.games // (args.workers * 16)))
+    counts = {"win": 0, "draw": 0, "loss": 0}
+    output = open(args.output, "w") if args.output else sys.stdout
+    record_writer = GameRecordWriter(args.record) if args.record else None
+
+    start = time.perf_counter()
+    try:
+        with Pool(args.workers, open_files, (args.book, args.weights)) as pool:
+            for record in pool.imap_unordered(run_game, tasks, chunksize):
+                counts[record["result"]] += 1
+                output.write(json.dumps(record) + "\n")
+                output.flush()
+                if record_writer is not None:
+                    record_writer.write(
+                        record["moves"], (record["black_discs"], record["white_discs"])
+                    )
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        if record_writer is not None:
+            record_writer.close()
+    elapsed = time.perf_counter() - start
+
+    print(summarize(args.player_a, args.player_b, counts, elapsed), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
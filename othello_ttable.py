@@ -0,0 +1,89 @@
+# Transposition table for the Othello search
+#
+# Entries live in flat typed arrays, so the memory use is fixed by the
+# number of entries and does not grow during the game.
+
+from array import array
+
+EXACT = 0
+LOWER = 1  # score is a lower bound (fail high)
+UPPER = 2  # score is an upper bound (fail low)
+
+NO_MOVE = -1
+
+# keys, scores, depths, bounds, moves and generations
+BYTES_PER_ENTRY = 8 + 4 + 1 + 1 + 1 + 1
+
+
+class TranspositionTable:
+    def __init__(self, entries: int = 1 << 18):
+        # round down to a power of two so the index is a mask
+        size = 1 << (max(entries, 1).bit_length() - 1)
+        self.size = size
+        self.mask = size - 1
+        self.keys = array("Q", bytes(8 * size))
+        self.scores = array("i", bytes(4 * size))
+        self.depths = array("b", bytes(size))
+        self.bounds = array("b", bytes(size))
+        self.moves = array("b", bytes(size))
+        self.generations = array("B", bytes(size))
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+
+    @classmethod
+    def from_megabytes(cls, megabytes: float) -> "TranspositionTable":
+        return cls(int(megabytes * 1024 * 1024) // BYTES_PER_ENTRY)
+
+    def new_search(self) -> None:
+        self.generation = (self.generation + 1) & 0xFF
+
+    def clear(self) -> None:
+        size = self.size
+        self.keys = array("Q", bytes(8 * size))
+        self.generations = array("B", bytes(size))
+        self.generation = 0
+
+    def probe(self, key: int) -> tuple[int, int, int, int] | None:
+        index = key & self.mask
+        stored = self.keys[index]
+        if stored == key:
+            self.hits += 1
+            return (
+                self.depths[index],
+                self.bounds[index],
+                self.scores[index],
+                self.moves[index],
+            )
+
+        self.misses += 1
+        if stored != 0:
+            self.collisions += 1
+        return None
+
+    def store(self, key: int, depth: int, bound: int, score: int, move: int) -> None:
+        index = key & self.mask
+        # depth-preferred, but entries left over from older searches always yield
+        if (
+            self.keys[index] == key
+            or self.generations[index] != self.generation
+            or depth >= self.depths[index]
+        ):
+            self.keys[index] = key
+            self.depths[index] = depth
+            self.bounds[index] = bound
+            self.scores[index] = score
+            self.moves[index] = move
+            self.generations[index] = self.generation
+
+    def stats(self) -> dict[str, int]:
+        used = sum(1 for key in self.keys if key != 0)
+        return {
+            "entries": self.size,
+            "used": used,
+            "bytes": self.size * BYTES_PER_ENTRY,
+            "hits": self.hits,
+            "misses": self.misses,
+            "collisions": self.collisions,
+        }
@@ -1,16 +1,29 @@
 # Othello game implementation with class
 
+from abc import ABC, abstractmethod
 from enum import Enum
-from typing import Self
+from typing import TYPE_CHECKING, Iterator, Self, Sequence
 
+import othello_core
+from othello_bitboard import (
+    PASS,
+    ZOBRIST_BLACK,
+    ZOBRIST_WHITE,
+    get_flip_directions,
+    get_flips,
+    get_flips_hash,
+    get_hash,
+    get_moves,
+    has_moves,
+    iter_flips,
+    to_positions,
+    to_square,
+    to_xy,
+)
+from othello_core import safe_input
 
-def safe_input(prompt: str) -> int:
-    while True:
-        try:
-            output = input(prompt)
-            return int(output)
-        except Exception as e:
-            print("Invalid input. Please enter a number.")
+if TYPE_CHECKING:
+    from othello_book import OpeningBook
 
 
 class Stone(Enum):
@@ -32,90 +45,201 @@ class Stone(Enum):
             return "*"
 
 
+class Player(ABC):
+    @abstractmethod
+    def get_move(self, othello: "Othello", color: Stone) -> tuple[int, int]:
+        pass
+
+    def stop(self) -> None:
+        # may be called from another thread; get_move returns as soon as it can
+        pass
+
+    def ponder(self, othello: "Othello", color: Stone) -> None:
+        # called after this player moved, while the opponent is thinking
+        pass
+
+    def stop_pondering(
+        self, othello: "Othello | None" = None, color: Stone | None = None
+    ) -> None:
+        # othello and color give the position about to be searched, if any
+        pass
+
+    def is_pondering(self, othello: "Othello", color: Stone) -> bool:
+        # whether a ponder search of this very position is running right now
+        return False
+
+    def close(self) -> None:
+        # called once the player is done, to stop any worker processes
+        pass
+
+
 class Othello:
     def __init__(self):
+        self.legal_moves: dict[Stone, int] = {}
+        # (square, flipped stones) for each move, PASS for a pass
+        self.history: list[tuple[int, int]] = []
         self.board = self.create_board()
 
+    @property
+    def board(self) -> tuple[tuple[Stone, ...], ...]:
+        # a read-only snapshot of the bitboards: writing to it raises instead
+        # of silently changing nothing. Assign a whole board, or use make_move
+        # or set_position, to change the position
+        black, white = self.black, self.white
+        cells = (Stone.EMPTY, Stone.BLACK, Stone.WHITE)
+        return tuple(
+            tuple(
+                cells[(black >> square & 1) | (white >> square & 1) << 1]
+                for square in range(y * 8, y * 8 + 8)
+            )
+            for y in range(8)
+        )
+
+    @board.setter
+    def board(self, board: Sequence[Sequence[Stone]]) -> None:
+        self.black = 0
+        self.white = 0
+        for y in range(8):
+            for x in range(8):
+                if board[y][x] == Stone.BLACK:
+                    self.black |= 1 << (y * 8 + x)
+                elif board[y][x] == Stone.WHITE:
+                    self.white |= 1 << (y * 8 + x)
+        self.legal_moves.clear()
+        self.history.clear()
+        self.hash = get_hash(self.black, self.white)
+
     def create_board(self) -> list[list[Stone]]:
-        b, w, e = Stone.BLACK, Stone.WHITE, Stone.EMPTY
-        return [
-            [e, e, e, e, e, e, e, e],
-            [e, e, e, e, e, e, e, e],
-            [e, e, e, e, e, e, e, e],
-            [e, e, e, w, b, e, e, e],
-            [e, e, e, b, w, e, e, e],
-            [e, e, e, e, e, e, e, e],
-            [e, e, e, e, e, e, e, e],
-            [e, e, e, e, e, e, e, e],
-        ]
+        return othello_core.create_board(Stone.BLACK, Stone.WHITE, Stone.EMPTY)
+
+    def copy(self) -> "Othello":
+        # a rules-only copy of the stones, without history
+        other = Othello()
+        other.set_bitboards(Stone.BLACK, self.black, self.white)
+        other.hash = self.hash
+        return other
+
+    def get_bitboards(self, color: Stone) -> tuple[int, int]:
+        if color == Stone.BLACK:
+            return self.black, self.white
+        return self.white, self.black
+
+    def set_position(self, color: Stone, player: int, opponent: int) -> None:
+        # replaces the stones like assigning a board: history cleared and
+        # Zobrist hash recomputed
+        self.set_bitboards(color, player, opponent)
+        self.history.clear()
+        self.hash = get_hash(self.black, self.white)
+
+    def set_bitboards(self, color: Stone, player: int, opponent: int) -> None:
+        # internal primitive for make_move and unmake_move: leaves the hash
+        # and the history alone, so callers must keep them in sync
+        if color == Stone.BLACK:
+            self.black, self.white = player, opponent
+        else:
+            self.white, self.black = player, opponent
+        self.legal_moves.clear()
 
     def print_board(self) -> None:
-        print(
-            f"black ({Stone.get_char(Stone.BLACK)}): {sum([row.count(Stone.BLACK) for row in self.board])}"
-        )
-        print(
-            f"white ({Stone.get_char(Stone.WHITE)}): {sum([row.count(Stone.WHITE) for row in self.board])}"
-        )
+        print(f"black ({Stone.get_char(Stone.BLACK)}): {self.black.bit_count()}")
+        print(f"white ({Stone.get_char(Stone.WHITE)}): {self.white.bit_count()}")
         print("  0 1 2 3 4 5 6 7")
-        for y in range(len(self.board)):
-            row = self.board[y]
+        board = self.board
+        for y in range(len(board)):
+            row = board[y]
             print(f"{y} " + " ".join([Stone.get_char(cell) for cell in row]))
         print()
 
     def is_on_board(self, x: int, y: int) -> bool:
-        return 0 <= x < 8 and 0 <= y < 8
+        return othello_core.is_on_board(x, y)
 
     def put(self, x: int, y: int, color: Stone):
-        if not self.is_on_board(x, y) or self.board[y][x] != Stone.EMPTY:
-            return
+        self.make_move(x, y, color)
+
+    def make_move(self, x: int, y: int, color: Stone) -> bool:
+        if not self.is_on_board(x, y):
+            return False
 
-        directions = self.get_flip_direction(x, y, color)
-        if len(directions) == 0:
+        square = to_square(x, y)
+        player, opponent = self.get_bitboards(color)
+        flips = get_flips(player, opponent, square)
+        if flips == 0:
+            return False
+
+        self.set_bitboards(color, player | flips | (1 << square), opponent & ~flips)
+        self.history.append((square, flips))
+        self.hash ^= self.get_stone_hash(square, color) ^ get_flips_hash(flips)
+        return True
+
+    def make_pass(self) -> None:
+        self.history.append((PASS, 0))
+
+    def unmake_move(self) -> None:
+        square, flips = self.history.pop()
+        if square == PASS:
             return
 
-        self.board[y][x] = color
-        for dx, dy in directions:
-            for i in range(1, 8):
-                cx, cy = x + dx * i, y + dy * i
-                if self.board[cy][cx] == Stone.flip_color(color):
-                    self.board[cy][cx] = color
-                else:
-                    break
+        bit = 1 << square
+        color = Stone.BLACK if self.black & bit else Stone.WHITE
+        player, opponent = self.get_bitboards(color)
+        self.set_bitboards(color, player & ~(flips | bit), opponent | flips)
+        self.hash ^= self.get_stone_hash(square, color) ^ get_flips_hash(flips)
+
+    def get_stone_hash(self, square: int, color: Stone) -> int:
+        if color == Stone.BLACK:
+            return ZOBRIST_BLACK[square]
+        return ZOBRIST_WHITE[square]
 
     def get_flip_direction(self, x: int, y: int, color: Stone) -> list[tuple[int, int]]:
-        directions = []
+        player, opponent = self.get_bitboards(color)
+        return get_flip_directions(player, opponent, to_square(x, y))
 
-        if self.board[y][x] != Stone.EMPTY:
-            return directions
+    def get_legal_moves(self, color: Stone) -> int:
+        moves = self.legal_moves.get(color)
+        if moves is None:
+            player, opponent = self.get_bitboards(color)
+            moves = get_moves(player, opponent)
+            self.legal_moves[color] = moves
+        return moves
 
-        for dx in [-1, 0, 1]:
-            for dy in [-1, 0, 1]:
-                opp_count = 0
-                for i in range(1, 8):
-                    cx, cy = x + dx * i, y + dy * i
+    def has_legal_move(self, color: Stone) -> bool:
+        # without building the move mask when it is not cached yet
+        moves = self.legal_moves.get(color)
+        if moves is not None:
+            return moves != 0
+        return has_moves(*self.get_bitboards(color))
 
-                    if not self.is_on_board(cx, cy):
-                        break
-                    elif self.board[cy][cx] == Stone.EMPTY:
-                        break
-                    elif self.board[cy][cx] == Stone.flip_color(color):
-                        opp_count += 1
-                    else:  # board[cy][cx] == color
-                        if opp_count > 0:
-                            directions.append((dx, dy))
-                        break
-        return directions
+    def is_game_over(self) -> bool:
+        return not self.has_legal_move(Stone.BLACK) and not self.has_legal_move(
+            Stone.WHITE
+        )
 
     def get_flip_positions(self, color: Stone) -> list[tuple[int, int]]:
-        positions = []
-        for y in range(len(self.board)):
-            for x in range(len(self.board[y])):
-                if len(self.get_flip_direction(x, y, color)) > 0:
-                    positions.append((x, y))
-        return positions
-
-    def play(self):
+        return to_positions(self.get_legal_moves(color))
+
+    def iter_legal_moves(self, color: Stone) -> Iterator[tuple[int, int]]:
+        # the moves of get_flip_positions, in the same order, one at a time
+        moves = self.get_legal_moves(color)
+        while moves:
+            low = moves & -moves
+            yield to_xy(low.bit_length() - 1)
+            moves ^= low
+
+    def iter_flips(self, x: int, y: int, color: Stone) -> Iterator[tuple[int, int]]:
+        if not self.is_on_board(x, y):
+            return
+        player, opponent = self.get_bitboards(color)
+        for square in iter_flips(player, opponent, to_square(x, y)):
+            yield to_xy(square)
+
+    def play(
+        self,
+        black: Player | None = None,
+        white: Player | None = None,
+        book: "OpeningBook | None" = None,
+    ):
         self.board = self.create_board()
+        players = {Stone.BLACK: black, Stone.WHITE: white}
 
         current_color = Stone.BLACK
         while True:
@@ -125,39 +249,175 @@ class Othello:
             )
             self.print_board()
 
-            black_flip_pos = self.get_flip_positions(Stone.BLACK)
-            white_flip_pos = self.get_flip_positions(Stone.WHITE)
-
-            if len(black_flip_pos) == 0 and len(white_flip_pos) == 0:
-                print("No valid moves for both players. Game over.")
-                break
-
-            if current_color == Stone.BLACK and len(black_flip_pos) == 0:
-                print("No valid moves for black. Switching to white.")
-                current_color = Stone.flip_color(current_color)
-                continue
-            if current_color == Stone.WHITE and len(white_flip_pos) == 0:
-                print("No valid moves for white. Switching to black.")
+            if not self.has_legal_move(current_color):
+                if not self.has_legal_move(Stone.flip_color(current_color)):
+                    print("No valid moves for both players. Game over.")
+                    for player in players.values():
+                        if player is not None:
+                            player.stop_pondering()
+                    break
+                if current_color == Stone.BLACK:
+                    print("No valid moves for black. Switching to white.")
+                else:
+                    print("No valid moves for white. Switching to black.")
                 current_color = Stone.flip_color(current_color)
                 continue
 
-            flip_pos = (
-                black_flip_pos if current_color == Stone.BLACK else white_flip_pos
-            )
-
-            while True:
-                x = safe_input("Enter x coordinate (0-7): ")
-                y = safe_input("Enter y coordinate (0-7): ")
+            player = players[current_color]
+            if player is None:
+                while True:
+                    x = safe_input("Enter x coordinate (0-7): ")
+                    y = safe_input("Enter y coordinate (0-7): ")
 
-                if (x, y) in flip_pos:
-                    break
-                else:
-                    print(f"Invalid move. Possible moves: {flip_pos}")
+                    if (x, y) in self.iter_legal_moves(current_color):
+                        break
+                    else:
+                        flip_pos = self.get_flip_positions(current_color)
+                        print(f"Invalid move. Possible moves: {flip_pos}")
+            else:
+                move = book.lookup(self, current_color) if book is not None else None
+                if move is None:
+                    move = player.get_move(self, current_color)
+                x, y = move
+                print(f"Computer move: ({x}, {y})")
 
             self.put(x, y, current_color)
+            if player is not None:
+                player.ponder(self, current_color)
             current_color = Stone.flip_color(current_color)
 
 
+def parse_options(description: str, gui: bool = False) -> dict:
+    import argparse
+
+    from othello_book import OpeningBook
+    from othello_engine import (
+        EnginePlayer,
+        GreedyPlayer,
+        PonderingPlayer,
+        RandomPlayer,
+    )
+
+    parser = argparse.ArgumentParser(description=description)
+    kinds = ["human", "engine", "greedy", "random", "mcts"]
+    parser.add_argument("--black", choices=kinds, default="human")
+    parser.add_argument("--white", choices=kinds, default="human")
+    parser.add_argument(
+        "--time-limit", type=int, default=1000, help="engine time per move (ms)"
+    )
+    parser.add_argument(
+        "--table-size",
+        type=int,
+        default=1 << 18,
+        help="transposition table entries (16 bytes each)",
+    )
+    parser.add_argument("--book", help="opening book used by the engine")
+    parser.add_argument("--weights", help="pattern evaluation weights for the engine")
+    parser.add_argument(
+        "--ponder",
+        action="store_true",
+        help="let the engine search the likely replies on the opponent's time",
+    )
+    parser.add_argument("--profile", help="write a JSON profile of the game here")
+    parser.add_argument(
+        "--profiler",
+        choices=["cprofile", "sample"],
+        help="also run cProfile or a sampling profiler (needs --profile)",
+    )
+    parser.add_argument(
+        "--mcts-workers",
+        type=int,
+        default=1,
+        help="processes searching in parallel for the mcts player",
+    )
+    parser.add_argument(
+        "--search-workers",
+        type=int,
+        default=1,
+        help="processes splitting the root moves of the engine's search",
+    )
+    if gui:
+        parser.add_argument(
+            "--worker",
+            choices=["thread", "process"],
+            default="thread",
+            help="where computer moves are computed",
+        )
+    args = parser.parse_args()
+    if gui and args.worker == "process" and args.mcts_workers > 1:
+        parser.error("--mcts-workers needs --worker thread")
+    if gui and args.worker == "process" and args.search_workers > 1:
+        parser.error("--search-workers needs --worker thread")
+    if args.ponder and args.search_workers > 1:
+        parser.error("--ponder cannot be combined with --search-workers")
+
+    evaluator = None
+    if args.weights:
+        from othello_pattern import PatternEvaluator
+
+        evaluator = PatternEvaluator(args.weights)
+
+    def create_player(kind: str) -> Player | None:
+        if kind == "engine" and args.ponder:
+            return PonderingPlayer(
+                args.time_limit, table_size=args.table_size, evaluator=evaluator
+            )
+        if kind == "engine" and args.search_workers > 1:
+            from othello_parallel import ParallelEnginePlayer
+
+            return ParallelEnginePlayer(
+                args.time_limit,
+                table_size=args.table_size,
+                evaluator=evaluator,
+                workers=args.search_workers,
+            )
+        if kind == "engine":
+            return EnginePlayer(
+                args.time_limit, table_size=args.table_size, evaluator=evaluator
+            )
+        if kind == "greedy":
+            return GreedyPlayer()
+        if kind == "random":
+            return RandomPlayer()
+        if kind == "mcts":
+            from othello_mcts import MCTSPlayer
+
+            return MCTSPlayer(args.time_limit, workers=args.mcts_workers)
+        return None
+
+    options = {
+        "black": create_player(args.black),
+        "white": create_player(args.white),
+        "book": OpeningBook(args.book) if args.book else None,
+    }
+    if gui:
+        options["worker"] = args.worker
+    if args.profile:
+        options["profile"] = {"path": args.profile, "profiler": args.profiler}
+    return options
+
+
+def close_players(options: dict) -> None:
+    for player in (options["black"], options["white"]):
+        if player is not None:
+            player.close()
+
+
 if __name__ == "__main__":
-    game = Othello()
-    game.play()
+    # run from the imported module, not __main__: the engine and the other
+    # players import othello_withclass, and a second copy of Stone would
+    # compare unequal to theirs
+    import othello_withclass
+
+    options = othello_withclass.parse_options("Othello")
+    profile = options.pop("profile", None)
+    game = othello_withclass.Othello()
+    try:
+        if profile is None:
+            game.play(**options)
+        else:
+            from othello_profile import profile_game
+
+            profile_game(game, game.play, options, **profile)
+    finally:
+        othello_withclass.close_players(options)
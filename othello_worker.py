@@ -0,0 +1,143 @@
+# Computer moves computed off the GUI thread
+#
+# A MoveWorker runs a Player's get_move in a background thread or process.
+# The caller starts a search, polls for the move while it keeps handling its
+# own events, and can cancel the search at any time.
+
+import multiprocessing
+import queue
+import signal
+import threading
+
+from othello_withclass import Othello, Player, Stone
+
+
+def restore_default_sigterm() -> None:
+    # processes forked after pygame.init() inherit SDL's SIGTERM handler,
+    # which only queues a quit event, so terminate() would not stop them
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+def search_in_process(
+    player: Player,
+    othello: Othello,
+    color: Stone,
+    generation: int,
+    results: multiprocessing.Queue,
+) -> None:
+    restore_default_sigterm()
+    engine = getattr(player, "engine", None)
+    if engine is not None:
+        engine.on_depth = lambda depth, nodes: results.put(
+            (generation, "progress", (depth, nodes))
+        )
+    results.put((generation, "move", player.get_move(othello, color)))
+
+
+class MoveWorker:
+    def __init__(self, player: Player, mode: str = "thread"):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"unknown worker mode: {mode}")
+        self.player = player
+        self.mode = mode
+        self.results = queue.Queue() if mode == "thread" else multiprocessing.Queue()
+        self.worker: threading.Thread | multiprocessing.Process | None = None
+        # a process search waiting for the ponder to finish: (board, color)
+        self.pending: tuple[Othello, Stone] | None = None
+        # results of cancelled searches carry an old generation and are dropped
+        self.generation = 0
+        self.depth = 0
+        self.nodes = 0
+
+    def is_running(self) -> bool:
+        return self.worker is not None or self.pending is not None
+
+    def start(self, othello: Othello, color: Stone) -> None:
+        # the ponder is not stopped here: when it is searching this very
+        # position, stop_pondering waits for that search, and this runs on
+        # the caller's (GUI) thread
+        self.stop_search()
+        self.generation += 1
+        self.depth = 0
+        self.nodes = 0
+        board = othello.copy()
+        if self.mode == "thread":
+            # get_move calls stop_pondering itself, in the worker thread
+            self.worker = threading.Thread(
+                target=self.search_in_thread,
+                args=(board, color, self.generation),
+                daemon=True,
+            )
+            self.worker.start()
+        else:
+            # forked once the ponder is done with this position (see poll),
+            # so that the process starts with its result
+            self.pending = (board, color)
+            self.start_process()
+
+    def start_process(self) -> None:
+        board, color = self.pending
+        if self.player.is_pondering(board, color):
+            return
+        self.pending = None
+        # no longer searching this position, so this does not wait
+        self.player.stop_pondering(board, color)
+        # a fresh queue, since terminate() can leave the old one unusable
+        self.results = multiprocessing.Queue()
+        self.worker = multiprocessing.Process(
+            target=search_in_process,
+            args=(self.player, board, color, self.generation, self.results),
+            daemon=True,
+        )
+        self.worker.start()
+
+    def search_in_thread(self, othello: Othello, color: Stone, generation: int):
+        self.results.put((generation, "move", self.player.get_move(othello, color)))
+
+    def poll(self) -> tuple[int, int] | None:
+        if self.pending is not None:
+            self.start_process()
+            if self.pending is not None:
+                return None
+        engine = getattr(self.player, "engine", None)
+        if self.mode == "thread" and engine is not None:
+            self.depth, self.nodes = engine.depth, engine.nodes
+
+        while True:
+            try:
+                generation, kind, value = self.results.get_nowait()
+            except queue.Empty:
+                return None
+            if generation != self.generation:
+                continue
+            if kind == "progress":
+                self.depth, self.nodes = value
+            elif kind == "move":
+                self.worker.join()
+                self.worker = None
+                return value
+
+    def ponder(self, othello: Othello, color: Stone) -> None:
+        self.player.ponder(othello, color)
+
+    def cancel(self) -> None:
+        self.player.stop_pondering()
+        self.stop_search()
+
+    def stop_search(self) -> None:
+        self.pending = None
+        if self.worker is None:
+            return
+        if self.mode == "thread":
+            while self.worker.is_alive():
+                # repeated in case the search had not started yet
+                self.player.stop()
+                self.worker.join(0.01)
+        else:
+            self.worker.terminate()
+            self.worker.join(1)
+            if self.worker.is_alive():
+                # terminated before it could restore the default handler
+                self.worker.kill()
+                self.worker.join()
+        self.worker = None